@@ -0,0 +1,7 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks of S3Tree against synthetic buckets in a mocked S3.
+
+Run them with `make bench`, or `python -m benchmarks.run --help` for the
+options.
+"""
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Synthetic buckets, shaped like the buckets S3Tree struggles with.
+
+Every generator fills a bucket through a boto3 client, and the number of
+keys it creates is proportional to `scale`.
+"""
+import os
+
+SMALL_OBJECT = b"x" * 1024
+
+
+def _put(client, bucket_name, keys, body=SMALL_OBJECT):
+    for key in keys:
+        client.put_object(Bucket=bucket_name, Key=key, Body=body)
+
+
+def wide(client, bucket_name, scale):
+    """Many files and directories at the root of the bucket."""
+    num_files = int(2000 * scale)
+    num_directories = int(200 * scale)
+
+    _put(client, bucket_name, ("file-{:06d}.txt".format(i) for i in range(num_files)))
+    _put(
+        client,
+        bucket_name,
+        (
+            "dir-{:04d}/file-{}.txt".format(i, j)
+            for i in range(num_directories)
+            for j in range(5)
+        ),
+    )
+
+
+def deep(client, bucket_name, scale):
+    """A binary tree of directories, 8 levels deep, with a few files in
+    every directory."""
+    files_per_directory = max(1, int(4 * scale))
+    keys = []
+    directories = [""]
+
+    for _ in range(8):
+        children = []
+
+        for path in directories:
+            keys.extend(
+                "{}file-{}.txt".format(path, i) for i in range(files_per_directory)
+            )
+            children.extend([path + "left/", path + "right/"])
+
+        directories = children
+
+    _put(client, bucket_name, keys)
+
+
+def huge_flat(client, bucket_name, scale):
+    """A single directory holding a lot of files."""
+    num_files = int(10000 * scale)
+    _put(
+        client,
+        bucket_name,
+        ("flat/{:08d}.json".format(i) for i in range(num_files)),
+    )
+
+
+def large_object(client, bucket_name, scale):
+    """A large file, and many small ones to read concurrently."""
+    size = max(1, int(32 * scale)) * 1024 * 1024
+    client.put_object(Bucket=bucket_name, Key="large.bin", Body=os.urandom(size))
+    _put(
+        client,
+        bucket_name,
+        ("small/{:04d}.bin".format(i) for i in range(int(200 * scale))),
+        body=os.urandom(64 * 1024),
+    )
+
+
+BUCKETS = {
+    "wide": wide,
+    "deep": deep,
+    "huge-flat": huge_flat,
+    "large-object": large_object,
+}
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Run the benchmarks, and compare them to a previous run.
+
+Every benchmark is timed a few times and the best time is kept. Its peak
+memory is measured in a separate run with `tracemalloc`, which slows it
+down too much to time it at the same time. Both include the work done by
+the mocked S3, so they are only meaningful compared to other runs on the
+same machine and versions of the dependencies.
+
+Usage:
+    $ python -m benchmarks.run --scale 0.1
+    $ python -m benchmarks.run --output baseline.json
+    $ python -m benchmarks.run --compare baseline.json --tolerance 0.2
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import boto3
+from moto import mock_s3
+
+import s3tree
+from s3tree.backends import MemoryBackend
+
+from .buckets import BUCKETS
+
+ACCESS_KEY_ID = "benchmark-key"
+SECRET_ACCESS_KEY = "benchmark-secret"
+
+
+def make_tree(bucket_name, path=None, **kwargs):
+    return s3tree.S3Tree(
+        bucket_name=bucket_name,
+        path=path,
+        aws_access_key_id=ACCESS_KEY_ID,
+        aws_secret_access_key=SECRET_ACCESS_KEY,
+        **kwargs
+    )
+
+
+def consume(iterable):
+    count = 0
+
+    for _ in iterable:
+        count += 1
+
+    return count
+
+
+def get_all_trees(tree):
+    """List every directory under a tree, one `get_tree()` at a time."""
+    count = 0
+
+    for directory in tree.directories:
+        count += 1 + get_all_trees(directory.get_tree())
+
+    return count
+
+
+def wide_benchmarks(bucket_name):
+    tree = make_tree(bucket_name)
+    return {
+        "construct": lambda: len(make_tree(bucket_name)),
+        "get_tree": lambda: get_all_trees(make_tree(bucket_name)),
+        "as_json": lambda: tree.as_json,
+        "walk": lambda: consume(make_tree(bucket_name).walk()),
+    }
+
+
+def deep_benchmarks(bucket_name):
+    return {
+        "construct": lambda: len(make_tree(bucket_name)),
+        "get_tree": lambda: get_all_trees(make_tree(bucket_name)),
+        "get_tree_flat": lambda: get_all_trees(make_tree(bucket_name, listing="flat")),
+        "walk": lambda: consume(make_tree(bucket_name).walk()),
+        "walk_flat": lambda: consume(make_tree(bucket_name, listing="flat").walk()),
+    }
+
+
+def huge_flat_benchmarks(bucket_name):
+    tree = make_tree(bucket_name, "flat")
+    return {
+        "construct": lambda: len(make_tree(bucket_name, "flat")),
+        "construct_sharded": lambda: len(make_tree(bucket_name, "flat", shards=4)),
+        "iter_entries": lambda: consume(
+            make_tree(bucket_name, "flat", lazy=True).iter_entries()
+        ),
+        "as_json": lambda: tree.as_json,
+        "find": lambda: consume(tree.find(min_size=1)),
+    }
+
+
+def large_object_benchmarks(bucket_name):
+    tree = make_tree(bucket_name)
+    large_file = [f for f in tree.files if f.name == "large.bin"][0]
+    small_files = tree.directories[0].get_tree().files
+
+    return {
+        "read": (lambda: large_file.read_bytes(), large_file.size_in_bytes),
+        "download": (
+            lambda: large_file.download(
+                bytearray(large_file.size_in_bytes), part_size=4 * 1024 * 1024
+            ),
+            large_file.size_in_bytes,
+        ),
+        "read_many": (
+            lambda: consume(tree.read_many(small_files)),
+            sum(f.size_in_bytes for f in small_files),
+        ),
+    }
+
+
+BENCHMARKS = {
+    "wide": wide_benchmarks,
+    "deep": deep_benchmarks,
+    "huge-flat": huge_flat_benchmarks,
+    "large-object": large_object_benchmarks,
+}
+
+
+def measure(func, repeat):
+    """Returns the best time of `func` in seconds, and its peak memory in
+    bytes."""
+    times = []
+
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+
+    tracemalloc.start()
+
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return min(times), peak
+
+
+def run(scenarios, scale, repeat, backend="moto"):
+    results = {}
+
+    if backend == "memory":
+        # every tree uses the backend, and the mocked S3 is never called
+        s3tree.config.backend = client = MemoryBackend()
+    else:
+        client = boto3.client(
+            "s3",
+            region_name="us-east-1",
+            aws_access_key_id=ACCESS_KEY_ID,
+            aws_secret_access_key=SECRET_ACCESS_KEY,
+        )
+
+    with mock_s3():
+        for scenario in scenarios:
+            bucket_name = "benchmark-" + scenario
+            client.create_bucket(Bucket=bucket_name)
+
+            start = time.time()
+            BUCKETS[scenario](client, bucket_name, scale)
+            print(
+                "{}: bucket generated in {:.1f}s".format(scenario, time.time() - start),
+                file=sys.stderr,
+            )
+
+            for name, benchmark in sorted(BENCHMARKS[scenario](bucket_name).items()):
+                func, size = (
+                    benchmark if isinstance(benchmark, tuple) else (benchmark, 0)
+                )
+                seconds, peak = measure(func, repeat)
+                result = {"seconds": seconds, "peak_bytes": peak}
+
+                if size:
+                    result["mb_per_second"] = size / seconds / 1024 / 1024
+
+                results["{}.{}".format(scenario, name)] = result
+
+    return results
+
+
+def report(results, baseline=None, tolerance=0.2):
+    """Print the results, and returns the names of the benchmarks which are
+    slower than in the baseline by more than `tolerance`."""
+    regressions = []
+    print(
+        "{:<32} {:>10} {:>12} {:>10} {:>9}".format(
+            "benchmark", "seconds", "peak MB", "MB/s", "change"
+        )
+    )
+
+    for name, result in sorted(results.items()):
+        change = ""
+
+        if baseline and name in baseline:
+            ratio = result["seconds"] / baseline[name]["seconds"] - 1
+            change = "{:+.0%}".format(ratio)
+
+            if ratio > tolerance:
+                regressions.append(name)
+                change += " !"
+
+        print(
+            "{:<32} {:>10.4f} {:>12.2f} {:>10} {:>9}".format(
+                name,
+                result["seconds"],
+                result["peak_bytes"] / 1024.0 / 1024,
+                (
+                    "{:.1f}".format(result["mb_per_second"])
+                    if "mb_per_second" in result
+                    else ""
+                ),
+                change,
+            )
+        )
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        help="Buckets to benchmark, among {}. Defaults to all of them.".format(
+            ", ".join(sorted(BENCHMARKS))
+        ),
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Size of the buckets, relative to the default sizes.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Number of times each benchmark is timed."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("moto", "memory"),
+        default="moto",
+        help="Serve the buckets from moto, or from s3tree.backends.MemoryBackend.",
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument(
+        "--compare", help="Compare the results to a JSON file written by --output."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Slowdown relative to the baseline reported as a regression.",
+    )
+    args = parser.parse_args(argv)
+
+    for scenario in args.scenarios:
+        if scenario not in BENCHMARKS:
+            parser.error("unknown bucket: {}".format(scenario))
+
+    results = run(
+        args.scenarios or sorted(BENCHMARKS), args.scale, args.repeat, args.backend
+    )
+
+    baseline = None
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+
+    regressions = report(results, baseline, args.tolerance)
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    if regressions:
+        print("Regressions: " + ", ".join(regressions), file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
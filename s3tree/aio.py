@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Asyncio front end for S3Tree.
+
+The blocking S3 requests are run in an executor, so that many listings and
+reads can be in flight at once without blocking the event loop. This module
+requires Python 3.6 or above, and is not imported by `s3tree` itself.
+"""
+import asyncio
+from functools import partial
+from itertools import islice
+
+from .core import S3Tree
+from .exceptions import TreeNotLoadedError
+from .models import Directory
+
+
+def _take(iterator, size):
+    return list(islice(iterator, size))
+
+
+class _AsyncWrapper(object):
+    """Proxy to a model object, which adds coroutines for the methods that
+    make requests. Only the attributes in `ATTRIBUTES`, which never make
+    requests, are forwarded to the object."""
+
+    ATTRIBUTES = ()
+
+    def __init__(self, obj, tree):
+        self._obj = obj
+        self._tree = tree
+
+    def __getattr__(self, name):
+        if name not in self.ATTRIBUTES:
+            raise AttributeError(name)
+        return getattr(self._obj, name)
+
+    def __str__(self):
+        return str(self._obj)
+
+
+class AsyncDirectory(_AsyncWrapper):
+    """Asyncio counterpart of `models.Directory`."""
+
+    ATTRIBUTES = ("path", "name", "as_dict", "as_json")
+
+    async def get_tree(self):
+        """Returns the tree under this directory, as an `AsyncS3Tree`."""
+        tree = await self._tree._run(self._obj.get_tree)
+        return await AsyncS3Tree._wrap(tree, self._tree.executor).load()
+
+
+class AsyncFile(_AsyncWrapper):
+    """Asyncio counterpart of `models.File`."""
+
+    ATTRIBUTES = (
+        "path",
+        "name",
+        "etag",
+        "last_modified",
+        "size",
+        "size_in_bytes",
+        "storage_class",
+        "content_type",
+        "metadata",
+        "mime",
+        "file_type",
+        "as_dict",
+        "as_json",
+    )
+
+    async def read(self):
+        """Read the contents of this file. This method returns a string."""
+        return await self._tree._run(self._obj.read)
+
+    async def read_bytes(self, encoding=None):
+        """Read the contents of this file. See `File.read_bytes()`."""
+        return await self._tree._run(self._obj.read_bytes, encoding=encoding)
+
+    async def read_range(self, start, end=None):
+        """Read a range of bytes of this file. See `File.read_range()`."""
+        return await self._tree._run(self._obj.read_range, start, end)
+
+    async def iter_chunks(self, **kwargs):
+        """Asynchronously iterate over the contents of this file in chunks.
+        Takes the same arguments as `File.iter_chunks()`."""
+        async for chunk in self._tree._iterate(self._obj.iter_chunks(**kwargs)):
+            yield chunk
+
+    async def download(self, dest, **kwargs):
+        """Download this file. Takes the same arguments as
+        `File.download()`."""
+        return await self._tree._run(self._obj.download, dest, **kwargs)
+
+
+class AsyncS3Tree(object):
+    """
+    Asyncio counterpart of `S3Tree`.
+
+    The tree is created and listed when it is awaited, and its entries can
+    then be accessed like those of an `S3Tree`. Directories and files are
+    wrapped so that `get_tree()` and `read()` are coroutines. The methods
+    of `S3Tree` which make requests are coroutines or asynchronous
+    iterators, and the other methods of `S3Tree` are not available.
+
+    Usage:
+        >>> tree = await AsyncS3Tree(bucket_name='demo', path='/css')
+        >>> len(tree)
+        12
+        >>> contents = await tree.files[0].read()
+        >>> async for obj in tree.iter_entries():
+        ...     print(obj.name)
+
+    Args:
+        bucket_name (str): Name of the S3 bucket.
+        path (:object: str, optional): The key of the path which should
+            be treated as the base of this tree.
+        executor (:object: concurrent.futures.Executor, optional): Executor
+            in which the requests are made. Defaults to the default executor
+            of the event loop. Its number of workers bounds the number of
+            requests in flight.
+        **kwargs: Any other argument accepted by `S3Tree`.
+    """
+
+    # attributes of the tree which never make requests once it is listed
+    ATTRIBUTES = (
+        "path",
+        "page_size",
+        "listing",
+        "endpoint_url",
+        "metrics",
+        "num_files",
+        "num_directories",
+        "as_json",
+    )
+
+    def __init__(self, bucket_name, path=None, executor=None, **kwargs):
+        self.bucket_name = bucket_name
+        self.executor = executor
+
+        # the tree is created in the executor, since creating its client
+        # blocks
+        self._tree_args = dict(kwargs, path=path, lazy=True)
+        self._sync_tree = None
+        self._loaded = False
+
+    @classmethod
+    def _wrap(cls, tree, executor):
+        async_tree = cls.__new__(cls)
+        async_tree.bucket_name = tree.bucket_name
+        async_tree.executor = executor
+        async_tree._sync_tree = tree
+        async_tree._loaded = False
+        return async_tree
+
+    def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def _iterate(self, iterator, batch_size=1):
+        """Asynchronously iterate over a blocking iterator, getting
+        `batch_size` items at a time in the executor."""
+        while True:
+            batch = await self._run(_take, iterator, batch_size)
+
+            if not batch:
+                break
+
+            for item in batch:
+                yield item
+
+    async def _get_tree(self):
+        """Returns the `S3Tree`, creating it in the executor first."""
+        if self._sync_tree is None:
+            self._sync_tree = await self._run(
+                S3Tree, self.bucket_name, **self._tree_args
+            )
+
+        return self._sync_tree
+
+    @property
+    def tree(self):
+        """The `S3Tree` of this tree. Its entries are only listed once this
+        tree is awaited."""
+        if self._sync_tree is None:
+            raise TreeNotLoadedError(self.bucket_name)
+        return self._sync_tree
+
+    @property
+    def _listed_tree(self):
+        if not self._loaded:
+            raise TreeNotLoadedError(self.bucket_name)
+        return self._sync_tree
+
+    def _wrap_entry(self, entry):
+        if isinstance(entry, Directory):
+            return AsyncDirectory(entry, self)
+        return AsyncFile(entry, self)
+
+    def __await__(self):
+        return self.load().__await__()
+
+    async def load(self):
+        """Create the tree, check the bucket and list the whole tree.
+        Returns this tree."""
+        tree = await self._get_tree()
+        await self._run(len, tree)
+        self._loaded = True
+        return self
+
+    def __getattr__(self, name):
+        if name not in self.ATTRIBUTES:
+            raise AttributeError(name)
+        return getattr(self._listed_tree, name)
+
+    def __len__(self):
+        return len(self._listed_tree)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._wrap_entry(entry) for entry in self._listed_tree[index]]
+        return self._wrap_entry(self._listed_tree[index])
+
+    def __iter__(self):
+        for entry in self._listed_tree:
+            yield self._wrap_entry(entry)
+
+    @property
+    def directories(self):
+        """List of all the directories in this tree."""
+        return [AsyncDirectory(d, self) for d in self._listed_tree.directories]
+
+    @property
+    def files(self):
+        """List of all the files in this tree."""
+        return [AsyncFile(f, self) for f in self._listed_tree.files]
+
+    async def iter_entries(self):
+        """Asynchronously iterate over the directories and files in this
+        tree, as the pages are listed. See `S3Tree.iter_entries()`."""
+        tree = await self._get_tree()
+        entries = tree.iter_entries()
+
+        async for entry in self._iterate(entries, tree.page_size or 1000):
+            yield self._wrap_entry(entry)
+
+    async def walk(self, **kwargs):
+        """Asynchronously walk this tree recursively. Takes the same
+        arguments as `S3Tree.walk()`."""
+        tree = await self._get_tree()
+
+        async for path, directories, files in self._iterate(tree.walk(**kwargs)):
+            yield (
+                path,
+                [AsyncDirectory(d, self) for d in directories],
+                [AsyncFile(f, self) for f in files],
+            )
+
+    async def read_many(self, files=None, **kwargs):
+        """Asynchronously read many files concurrently. Takes the same
+        arguments as `S3Tree.read_many()`, and yields the files wrapped as
+        `AsyncFile`."""
+        tree = await self._get_tree()
+
+        if files is not None and not callable(files):
+            files = [getattr(f, "_obj", f) for f in files]
+
+        async for file_obj, contents in self._iterate(tree.read_many(files, **kwargs)):
+            yield AsyncFile(file_obj, self), contents
+
+    async def find(self, **kwargs):
+        """Asynchronously iterate over the files under this tree. Takes the
+        same arguments as `S3Tree.find()`."""
+        tree = await self._get_tree()
+
+        async for file_obj in self._iterate(
+            tree.find(**kwargs), tree.page_size or 1000
+        ):
+            yield AsyncFile(file_obj, self)
+
+    async def glob(self, pattern):
+        """Asynchronously iterate over the files matching a pattern. See
+        `S3Tree.glob()`."""
+        tree = await self._get_tree()
+
+        async for file_obj in self._iterate(tree.glob(pattern), tree.page_size or 1000):
+            yield AsyncFile(file_obj, self)
+
+    async def stats(self, **kwargs):
+        """Compute the statistics of this tree. See `S3Tree.stats()`."""
+        tree = await self._get_tree()
+        return await self._run(tree.stats, **kwargs)
+
+    async def snapshot(self):
+        """Take a snapshot of the files under this tree. See
+        `S3Tree.snapshot()`."""
+        tree = await self._get_tree()
+        return await self._run(tree.snapshot)
+
+    async def diff(self, previous, **kwargs):
+        """Find the changes since a snapshot. See `S3Tree.diff()`."""
+        tree = await self._get_tree()
+        return await self._run(tree.diff, previous, **kwargs)
+
+    async def fetch_metadata(self, files=None, **kwargs):
+        """Fetch the metadata of files. Takes the same arguments as
+        `S3Tree.fetch_metadata()`."""
+        tree = await self._get_tree()
+
+        if files is not None:
+            files = [getattr(f, "_obj", f) for f in files]
+
+        errors = await self._run(tree.fetch_metadata, files, **kwargs)
+        return [(AsyncFile(file_obj, self), error) for file_obj, error in errors]
+
+    async def dump(self, fp, **kwargs):
+        """Export this tree to a file. See `S3Tree.dump()`."""
+        tree = await self._get_tree()
+        return await self._run(tree.dump, fp, **kwargs)
+
+    async def write_index(self, path):
+        """Write the index of the files under this tree. See
+        `S3Tree.write_index()`."""
+        tree = await self._get_tree()
+        return await self._run(tree.write_index, path)
@@ -0,0 +1,512 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Storage backends which can be used by trees in place of S3.
+
+A tree makes all of its requests through a boto3 S3 client, so a backend is
+any object with the same interface: the `head_bucket`, `list_objects_v2`,
+`head_object` and `get_object` methods, taking and returning the same
+dictionaries, `exceptions.NoSuchKey`, and `meta.endpoint_url`. The backends
+in this module serve buckets from memory or from a local directory, without
+any network access.
+
+Trees using a backend have no credentials, so their cached listings and
+contents and the buckets they have checked are keyed by the endpoint URL of
+the backend alone. A backend must therefore have an endpoint URL of its
+own, which is why boto3 clients, whose endpoint URL is shared by all the
+credentials, are not backends: trees access S3 with credentials instead.
+"""
+import hashlib
+import io
+import mimetypes
+import os
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime
+from itertools import count
+from threading import Lock
+
+from botocore.exceptions import ClientError
+from dateutil.tz import tzutc
+from six import text_type
+
+DEFAULT_MAX_KEYS = 1000
+
+# the methods of boto3 clients implemented by the backends
+OPERATIONS = {
+    "head_bucket": "HeadBucket",
+    "list_objects_v2": "ListObjectsV2",
+    "head_object": "HeadObject",
+    "get_object": "GetObject",
+}
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_memory_backends = count()
+
+# number of directory listings kept by every filesystem backend
+_FILESYSTEM_LISTINGS = 16
+
+
+class NoSuchKey(ClientError):
+    pass
+
+
+class NoSuchBucket(ClientError):
+    pass
+
+
+class _Exceptions(object):
+    ClientError = ClientError
+    NoSuchKey = NoSuchKey
+    NoSuchBucket = NoSuchBucket
+
+
+class _Meta(object):
+    def __init__(self, endpoint_url):
+        self.endpoint_url = endpoint_url
+        self.method_to_api_mapping = dict(OPERATIONS)
+
+
+class _Body(object):
+    """File-like object which reads at most `length` bytes of a file."""
+
+    def __init__(self, fp, length):
+        self._fp = fp
+        self._remaining = length
+
+    def read(self, amt=None):
+        if amt is None or amt > self._remaining:
+            amt = self._remaining
+
+        data = self._fp.read(amt)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._fp.close()
+
+
+def _error(exc_class, code, operation, status, message=""):
+    return exc_class(
+        {
+            "Error": {"Code": code, "Message": message},
+            "ResponseMetadata": {"HTTPStatusCode": status},
+        },
+        operation,
+    )
+
+
+def _metadata(status=200, content_length=0):
+    return {
+        "HTTPStatusCode": status,
+        "HTTPHeaders": {"content-length": str(content_length)},
+    }
+
+
+def _mtime(path):
+    """Returns the modification time of a path, or `None` if it doesn't
+    exist."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _next_prefix(prefix):
+    """Returns the first string after all the strings starting with
+    `prefix`."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _parse_range(header, size, operation):
+    """Returns the first and last bytes of a range header, or `None` if
+    the whole object is requested."""
+    match = _RANGE_RE.match(header or "")
+
+    # like S3, ignore range headers that can't be parsed
+    if match is None or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+
+    if start >= size or end < start:
+        raise _error(ClientError, "InvalidRange", operation, 416)
+
+    return start, end
+
+
+class Backend(object):
+    """
+    Base of the backends, which implements S3 requests on top of a few
+    methods that subclasses provide to read their storage.
+
+    Subclasses implement `_bucket_exists(bucket)`, `_keys(bucket, prefix)`
+    to return a sorted list of keys in a bucket, holding at least all the
+    keys starting with `prefix`, or `None` if the bucket doesn't exist,
+    `_stat(bucket, key)` to return a dict with the `Size`,
+    `ETag`, `LastModified`, `ContentType` and `Metadata` of an object, or
+    `None` if it doesn't exist, and `_open(bucket, key)` to open an object
+    for reading.
+
+    Args:
+        endpoint_url (str): URL identifying this backend, which is used in
+            place of the S3 endpoint in the keys of the caches.
+    """
+
+    exceptions = _Exceptions
+
+    def __init__(self, endpoint_url):
+        self.meta = _Meta(endpoint_url)
+
+    def _bucket_exists(self, bucket):
+        return self._keys(bucket) is not None
+
+    def _keys(self, bucket, prefix=""):
+        raise NotImplementedError
+
+    def _stat(self, bucket, key):
+        raise NotImplementedError
+
+    def _open(self, bucket, key):
+        raise NotImplementedError
+
+    def head_bucket(self, Bucket, **kwargs):
+        if not self._bucket_exists(Bucket):
+            raise _error(ClientError, "404", "HeadBucket", 404)
+
+        return {"ResponseMetadata": _metadata()}
+
+    def list_objects_v2(
+        self,
+        Bucket,
+        Prefix="",
+        Delimiter=None,
+        MaxKeys=DEFAULT_MAX_KEYS,
+        ContinuationToken=None,
+        StartAfter=None,
+        **kwargs
+    ):
+        keys = self._keys(Bucket, Prefix)
+
+        if keys is None:
+            raise _error(NoSuchBucket, "NoSuchBucket", "ListObjectsV2", 404)
+
+        index = bisect_left(keys, Prefix)
+
+        if StartAfter:
+            index = max(index, bisect_right(keys, StartAfter))
+
+        # tokens hold the last key or common prefix listed
+        if ContinuationToken:
+            kind, last = ContinuationToken[0], ContinuationToken[1:]
+            index = max(index, bisect_right(keys, last))
+
+            if kind == "p":
+                index = max(index, bisect_left(keys, _next_prefix(last)))
+
+        contents = []
+        prefixes = []
+        last_listed = None
+        token = None
+
+        while index < len(keys) and keys[index].startswith(Prefix):
+            if len(contents) + len(prefixes) >= MaxKeys:
+                token = last_listed
+                break
+
+            key = keys[index]
+            position = key.find(Delimiter, len(Prefix)) if Delimiter else -1
+
+            if position < 0:
+                contents.append(key)
+                last_listed = "k" + key
+                index += 1
+                continue
+
+            # skip all the keys in this common prefix at once. Like S3, a
+            # common prefix before `StartAfter` is not listed at all.
+            common_prefix = key[: position + len(Delimiter)]
+            index = bisect_left(keys, _next_prefix(common_prefix))
+
+            if not (StartAfter and common_prefix <= StartAfter):
+                prefixes.append(common_prefix)
+                last_listed = "p" + common_prefix
+
+        response = {
+            "Name": Bucket,
+            "Prefix": Prefix,
+            "MaxKeys": MaxKeys,
+            "KeyCount": len(contents) + len(prefixes),
+            "IsTruncated": token is not None,
+            "ResponseMetadata": _metadata(),
+        }
+
+        if contents:
+            response["Contents"] = [self.__listed_object(Bucket, k) for k in contents]
+
+        if prefixes:
+            response["CommonPrefixes"] = [{"Prefix": p} for p in prefixes]
+
+        if Delimiter:
+            response["Delimiter"] = Delimiter
+
+        if token is not None:
+            response["NextContinuationToken"] = token
+
+        return response
+
+    def __listed_object(self, bucket, key):
+        stat = self._stat(bucket, key)
+        return {
+            "Key": key,
+            "LastModified": stat["LastModified"],
+            "ETag": stat["ETag"],
+            "Size": stat["Size"],
+            "StorageClass": "STANDARD",
+        }
+
+    def __stat(self, operation, Bucket, Key, IfMatch=None, IfNoneMatch=None):
+        if not self._bucket_exists(Bucket):
+            raise _error(NoSuchBucket, "NoSuchBucket", operation, 404)
+
+        stat = self._stat(Bucket, Key)
+
+        if stat is None:
+            if operation == "HeadObject":
+                raise _error(ClientError, "404", operation, 404)
+            raise _error(NoSuchKey, "NoSuchKey", operation, 404)
+
+        if IfMatch is not None and IfMatch != stat["ETag"]:
+            raise _error(ClientError, "PreconditionFailed", operation, 412)
+
+        if IfNoneMatch is not None and IfNoneMatch == stat["ETag"]:
+            raise _error(ClientError, "304", operation, 304)
+
+        return stat
+
+    def head_object(self, Bucket, Key, IfMatch=None, IfNoneMatch=None, **kwargs):
+        stat = self.__stat("HeadObject", Bucket, Key, IfMatch, IfNoneMatch)
+        response = dict(stat, ContentLength=stat["Size"], AcceptRanges="bytes")
+        del response["Size"]
+        response["ResponseMetadata"] = _metadata()
+        return response
+
+    def get_object(
+        self, Bucket, Key, Range=None, IfMatch=None, IfNoneMatch=None, **kwargs
+    ):
+        stat = self.__stat("GetObject", Bucket, Key, IfMatch, IfNoneMatch)
+        size = stat["Size"]
+        byte_range = _parse_range(Range, size, "GetObject")
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1
+
+        fp = self._open(Bucket, Key)
+        fp.seek(start)
+
+        response = dict(
+            stat,
+            Body=_Body(fp, length),
+            ContentLength=length,
+            AcceptRanges="bytes",
+            ResponseMetadata=_metadata(206 if byte_range else 200, length),
+        )
+        del response["Size"]
+
+        if byte_range:
+            response["ContentRange"] = "bytes {}-{}/{}".format(start, end, size)
+
+        return response
+
+
+class MemoryBackend(Backend):
+    """
+    Backend which stores buckets in memory. It is filled like S3, with the
+    `create_bucket` and `put_object` methods of boto3 clients.
+
+    Usage:
+        >>> backend = MemoryBackend()
+        >>> backend.create_bucket(Bucket='demo')
+        >>> backend.put_object(Bucket='demo', Key='css/base.css', Body=b'...')
+        >>> tree = S3Tree(bucket_name='demo', backend=backend)
+    """
+
+    def __init__(self):
+        super(MemoryBackend, self).__init__(
+            "memory://{}".format(next(_memory_backends))
+        )
+        self._lock = Lock()
+        self._buckets = {}
+        self._keys_by_bucket = {}
+
+    def create_bucket(self, Bucket, **kwargs):
+        with self._lock:
+            self._buckets.setdefault(Bucket, {})
+            self._keys_by_bucket.setdefault(Bucket, [])
+
+        return {"ResponseMetadata": _metadata()}
+
+    def put_object(
+        self, Bucket, Key, Body=b"", ContentType=None, Metadata=None, **kwargs
+    ):
+        if isinstance(Body, text_type):
+            Body = Body.encode("utf-8")
+        elif not isinstance(Body, bytes):
+            Body = Body.read()
+
+        etag = '"{}"'.format(hashlib.md5(Body).hexdigest())
+        stat = {
+            "Size": len(Body),
+            "ETag": etag,
+            "LastModified": datetime.now(tzutc()).replace(microsecond=0),
+            "ContentType": ContentType or "binary/octet-stream",
+            "Metadata": dict(Metadata or {}),
+        }
+
+        with self._lock:
+            if Bucket not in self._buckets:
+                raise _error(NoSuchBucket, "NoSuchBucket", "PutObject", 404)
+
+            if Key not in self._buckets[Bucket]:
+                insort(self._keys_by_bucket[Bucket], Key)
+
+            self._buckets[Bucket][Key] = (stat, Body)
+
+        return {"ETag": etag, "ResponseMetadata": _metadata()}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        with self._lock:
+            if self._buckets.get(Bucket, {}).pop(Key, None) is not None:
+                self._keys_by_bucket[Bucket].remove(Key)
+
+        return {"ResponseMetadata": _metadata(204)}
+
+    def _bucket_exists(self, bucket):
+        return bucket in self._buckets
+
+    def _keys(self, bucket, prefix=""):
+        return self._keys_by_bucket.get(bucket)
+
+    def _stat(self, bucket, key):
+        entry = self._buckets[bucket].get(key)
+        return dict(entry[0]) if entry else None
+
+    def _open(self, bucket, key):
+        return io.BytesIO(self._buckets[bucket][key][1])
+
+
+class FilesystemBackend(Backend):
+    """
+    Backend which serves the directories of a local directory as buckets,
+    and the files under them as objects, like a mirror of S3 on disk.
+
+    The ETags of the files are derived from their size and modification
+    time rather than their contents, so that listing them doesn't read
+    them. Only the directory holding a prefix is walked to list it, and its
+    sorted keys are kept until one of its directories is modified, so
+    listing a large directory page by page walks it once.
+
+    Usage:
+        >>> tree = S3Tree(bucket_name='demo', backend=FilesystemBackend('/srv/mirror'))
+        # the tree of the files under /srv/mirror/demo
+
+    Args:
+        root (str): The directory holding the buckets.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        super(FilesystemBackend, self).__init__("file://" + self.root)
+
+        # (bucket, directory) -> (modification times of the directories
+        # walked, sorted keys), least recently used first
+        self.__listings = OrderedDict()
+        self.__lock = Lock()
+
+    def __bucket_path(self, bucket):
+        path = os.path.join(self.root, bucket)
+
+        if os.sep in bucket or bucket in ("", ".", "..") or not os.path.isdir(path):
+            return None
+
+        return path
+
+    def __path(self, bucket, key):
+        bucket_path = self.__bucket_path(bucket)
+        parts = key.split("/")
+
+        if bucket_path is None or "" in parts or "." in parts or ".." in parts:
+            return None
+
+        return os.path.join(bucket_path, *parts)
+
+    def _bucket_exists(self, bucket):
+        return self.__bucket_path(bucket) is not None
+
+    def _keys(self, bucket, prefix=""):
+        bucket_path = self.__bucket_path(bucket)
+
+        if bucket_path is None:
+            return None
+
+        # only the keys under the directory part of the prefix can start
+        # with it
+        directory = prefix[: prefix.rfind("/") + 1]
+        parts = directory.split("/")[:-1]
+
+        if "" in parts or "." in parts or ".." in parts:
+            return []
+
+        with self.__lock:
+            listing = self.__listings.pop((bucket, directory), None)
+
+            if listing is not None:
+                self.__listings[(bucket, directory)] = listing
+
+        if listing is not None and all(
+            _mtime(path) == mtime for path, mtime in listing[0].items()
+        ):
+            return listing[1]
+
+        top = os.path.join(bucket_path, *parts)
+        mtimes = {top: _mtime(top)}
+        keys = []
+
+        for path, _, files in os.walk(top):
+            mtimes[path] = _mtime(path)
+            relative = os.path.relpath(path, top)
+            path_prefix = "" if relative == "." else relative.replace(os.sep, "/") + "/"
+            keys.extend(directory + path_prefix + name for name in files)
+
+        keys.sort()
+
+        with self.__lock:
+            self.__listings[(bucket, directory)] = (mtimes, keys)
+
+            while len(self.__listings) > _FILESYSTEM_LISTINGS:
+                self.__listings.popitem(last=False)
+
+        return keys
+
+    def _stat(self, bucket, key):
+        path = self.__path(bucket, key)
+
+        if path is None or not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        return {
+            "Size": stat.st_size,
+            "ETag": '"{:x}-{:x}"'.format(int(stat.st_mtime * 1e6), stat.st_size),
+            "LastModified": datetime.fromtimestamp(int(stat.st_mtime), tzutc()),
+            "ContentType": mimetypes.guess_type(path)[0] or "binary/octet-stream",
+            "Metadata": {},
+        }
+
+    def _open(self, bucket, key):
+        return io.open(self.__path(bucket, key), "rb")
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Caches for the listings of trees."""
+import json
+import os
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from threading import Lock
+
+from dateutil.parser import parse as parse_datetime
+
+# fields of the listed objects which are kept in the cache
+OBJECT_FIELDS = ("Key", "ETag", "Size", "StorageClass")
+
+
+def _compact_page(page):
+    """Returns the parts of a `list_objects_v2` response that are needed to
+    build a tree from it, in a form that can be serialized to JSON."""
+    contents = []
+
+    for obj in page.get("Contents", []):
+        data = {f: obj[f] for f in OBJECT_FIELDS if f in obj}
+        data["LastModified"] = obj["LastModified"].isoformat()
+        contents.append(data)
+
+    return {
+        "CommonPrefixes": [
+            {"Prefix": p["Prefix"]} for p in page.get("CommonPrefixes", [])
+        ],
+        "Contents": contents,
+        "KeyCount": page.get("KeyCount", 0),
+    }
+
+
+def _expand_page(page):
+    for obj in page["Contents"]:
+        obj["LastModified"] = parse_datetime(obj["LastModified"])
+    return page
+
+
+def _estimate_size(value):
+    """Roughly estimate the memory used by a cached value, in bytes."""
+    if isinstance(value, bytes):
+        return len(value)
+
+    if isinstance(value, tuple):
+        return sum(_estimate_size(v) for v in value)
+
+    if isinstance(value, list):
+        # the pages of a listing
+        size = 0
+
+        for page in value:
+            for prefix in page.get("CommonPrefixes", []):
+                size += 100 + len(prefix["Prefix"])
+
+            for obj in page.get("Contents", []):
+                size += 400 + len(obj["Key"])
+
+        return size
+
+    return 100
+
+
+def cache_when_complete(cache, key, pages):
+    """Iterate over `pages`, and store them in `cache` under `key` once they
+    have all been iterated over. Incomplete listings are never cached."""
+    listed = []
+
+    for page in pages:
+        listed.append(page)
+        yield page
+
+    cache.set(key, listed)
+
+
+class ListingCache(object):
+    """
+    Persistent cache of listings, stored in a SQLite database on disk.
+
+    Listings are stored once they are complete, and are served from the
+    cache until they are older than `ttl`, after which the prefix is listed
+    again. The least recently used listings are evicted when the cache holds
+    more than `max_entries` of them. Listings are cached by access key ID,
+    so a cache shared by several users only serves each of them the
+    listings made with their own credentials.
+
+    Usage:
+        >>> s3tree.config.listing_cache = ListingCache('~/.cache/s3tree.db')
+
+    Args:
+        path (str): Path of the database file. It is created if it doesn't
+            exist.
+        ttl (:object: int, optional): Number of seconds for which a listing
+            is fresh. Defaults to one hour.
+        max_entries (:object: int, optional): Maximum number of listings
+            kept in the cache. Defaults to 10000.
+    """
+
+    def __init__(self, path, ttl=3600, max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = Lock()
+        self._db = sqlite3.connect(os.path.expanduser(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            "key TEXT PRIMARY KEY, pages BLOB, created REAL, accessed REAL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(key)
+
+    def get(self, key):
+        """Returns the pages cached under `key`, or `None` if there are none
+        or they are stale."""
+        now = time.time()
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT pages, created FROM listings WHERE key = ?", (self._key(key),)
+            ).fetchone()
+
+            if row is None or row[1] + self.ttl <= now:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+            self._db.execute(
+                "UPDATE listings SET accessed = ? WHERE key = ?", (now, self._key(key))
+            )
+            self._db.commit()
+
+        pages = json.loads(zlib.decompress(row[0]).decode("utf-8"))
+        return [_expand_page(page) for page in pages]
+
+    def set(self, key, pages):
+        """Cache the pages of a complete listing under `key`."""
+        now = time.time()
+        data = json.dumps([_compact_page(page) for page in pages])
+        blob = sqlite3.Binary(zlib.compress(data.encode("utf-8")))
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?)",
+                (self._key(key), blob, now, now),
+            )
+            self._db.execute(
+                "DELETE FROM listings WHERE key NOT IN ("
+                "SELECT key FROM listings ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def clear(self):
+        """Remove all the listings from the cache."""
+        with self._lock:
+            self._db.execute("DELETE FROM listings")
+            self._db.commit()
+
+
+class MemoryCache(object):
+    """
+    In-process LRU cache of listings and file contents.
+
+    It can be used like `ListingCache` to cache listings, and as the body
+    cache of a tree to cache the contents read with `File.read()`. Entries
+    are fresh for `ttl` seconds. Stale file contents are revalidated with a
+    conditional request on their ETag, and are only downloaded again if the
+    file has changed. The least recently used entries are evicted when the
+    cache holds more than `max_entries` entries or `max_bytes` bytes.
+
+    The `hits`, `misses` and `evictions` counters can be used to monitor the
+    cache.
+
+    Usage:
+        >>> s3tree.config.listing_cache = MemoryCache(max_entries=1000)
+        >>> s3tree.config.body_cache = MemoryCache(max_bytes=64 * 1024 * 1024)
+
+    Args:
+        max_entries (:object: int, optional): Maximum number of entries.
+            Defaults to 1000.
+        max_bytes (:object: int, optional): Maximum size of all the entries,
+            in bytes. The size of listings is estimated. Defaults to 64 MB.
+        ttl (:object: int, optional): Number of seconds for which an entry
+            is fresh. Defaults to one minute.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024, ttl=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        """Estimated size of all the entries, in bytes."""
+        return self._size
+
+    def get(self, key, stale=False):
+        """Returns the value cached under `key`, or `None` if there is none
+        or it is stale. If `stale` is `True`, stale values are returned too,
+        but are not counted as hits."""
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, _, created = entry
+            fresh = created + self.ttl > time.time()
+
+            if not (fresh or stale):
+                self.misses += 1
+                return None
+
+            if fresh:
+                self.hits += 1
+
+            # move the entry to the end, as the most recently used
+            del self._entries[key]
+            self._entries[key] = entry
+            return value
+
+    def lookup(self, key):
+        """Returns a `(value, fresh)` tuple for the value cached under `key`,
+        stale or not, or `(None, False)` if there is none. Lookups are not
+        counted: the caller decides whether the value can be used, and
+        counts it with `record()`."""
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None, False
+
+            value, _, created = entry
+
+            # move the entry to the end, as the most recently used
+            del self._entries[key]
+            self._entries[key] = entry
+            return value, created + self.ttl > time.time()
+
+    def record(self, hit):
+        """Count a hit, or a miss, of a lookup made with `lookup()`."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def set(self, key, value):
+        """Cache `value` under `key`. Values larger than the cache are not
+        cached at all."""
+        size = _estimate_size(value)
+
+        with self._lock:
+            self.__remove(key)
+
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size, time.time())
+            self._size += size
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self.__remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def __remove(self, key):
+        entry = self._entries.pop(key, None)
+
+        if entry is not None:
+            self._size -= entry[1]
+
+    def clear(self):
+        """Remove all the entries from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Checkpoints of walks, used to resume them after a restart."""
+import json
+import os
+
+from .exceptions import InvalidCheckpointError
+from .utils import clock, replace_file
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+# minimum number of seconds between two saves of a checkpoint
+DEFAULT_CHECKPOINT_INTERVAL = 10
+
+
+class WalkCheckpoint(object):
+    """
+    The listings that remain to be made by a walk, stored in a JSON file.
+
+    Every listing is a `(prefix, continuation token, depth)` tuple, where the
+    token is `None` for the first page of a prefix. The file is replaced
+    atomically, so that it always holds a complete checkpoint, even if the
+    process dies while saving it. Since every save writes all the listings
+    that remain, a walk only saves its checkpoint when it is `due()`, at
+    most once every `interval` seconds.
+
+    Args:
+        path (str): Path of the checkpoint file.
+        bucket_name (str): Name of the S3 bucket walked.
+        base (str): The normalized path of the tree walked.
+        interval (:object: float, optional): Minimum number of seconds
+            between two saves. Defaults to 10.
+    """
+
+    def __init__(self, path, bucket_name, base, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = os.path.expanduser(path)
+        self.bucket_name = bucket_name
+        self.base = base
+        self.interval = interval
+
+        # time of the last save, if any
+        self._saved_at = None
+
+    def load(self):
+        """Returns the listings saved in the checkpoint file, or `None` if
+        there is no checkpoint yet."""
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path) as fp:
+            data = json.load(fp)
+
+        if (data["bucket_name"], data["path"]) != (self.bucket_name, self.base):
+            raise InvalidCheckpointError(self.path)
+
+        return [tuple(listing) for listing in data["pending"]]
+
+    def due(self):
+        """Returns whether `interval` seconds have passed since the last
+        save, or nothing has been saved yet."""
+        return self._saved_at is None or clock() - self._saved_at >= self.interval
+
+    def save(self, pending):
+        """Replace the checkpoint with the listings in `pending`."""
+        self._saved_at = clock()
+        temp_path = self.path + ".tmp"
+
+        with open(temp_path, "w") as fp:
+            json.dump(
+                {
+                    "version": CHECKPOINT_FORMAT_VERSION,
+                    "bucket_name": self.bucket_name,
+                    "path": self.base,
+                    "pending": [list(listing) for listing in pending],
+                },
+                fp,
+            )
+
+        replace_file(temp_path, self.path)
+
+    def clear(self):
+        """Remove the checkpoint file, once the walk is complete."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""A pool of boto3 S3 resources shared by all the trees in a process."""
+from threading import Lock
+
+from boto3 import Session
+from botocore.config import Config
+
+BOTO3_S3_RESOURCE_ID = "s3"
+
+_resources = {}
+_lock = Lock()
+
+
+def get_resource(
+    aws_access_key_id,
+    aws_secret_access_key,
+    region_name=None,
+    endpoint_url=None,
+    max_pool_connections=None,
+):
+    """Return an S3 resource for the given credentials and endpoint.
+
+    Creating a session and a resource loads the botocore service model,
+    which is expensive, so a single resource is created for every distinct
+    set of arguments and reused afterwards. The client of the resource
+    (`resource.meta.client`) is thread safe, and can be shared between
+    threads.
+
+    Args:
+        aws_access_key_id (str): The AWS access key ID.
+        aws_secret_access_key (str): The AWS secret access key.
+        region_name (:object: str, optional): The AWS region.
+        endpoint_url (:object: str, optional): URL of an S3 compatible
+            endpoint to use instead of AWS.
+        max_pool_connections (:object: int, optional): Maximum number of
+            connections kept open by the client.
+
+    Returns:
+        boto3.resources.base.ServiceResource
+    """
+    key = (
+        aws_access_key_id,
+        aws_secret_access_key,
+        region_name,
+        endpoint_url,
+        max_pool_connections,
+    )
+
+    with _lock:
+        if key not in _resources:
+            session = Session(
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+            )
+            _resources[key] = session.resource(
+                BOTO3_S3_RESOURCE_ID,
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                config=(
+                    Config(max_pool_connections=max_pool_connections)
+                    if max_pool_connections
+                    else None
+                ),
+            )
+
+        return _resources[key]
+
+
+def clear():
+    """Forget all the pooled resources."""
+    with _lock:
+        _resources.clear()
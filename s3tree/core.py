@@ -3,17 +3,45 @@
 
 from __future__ import absolute_import
 
-from collections import Sequence
+try:
+    from collections.abc import Sequence
+except ImportError:  # pragma: no cover
+    from collections import Sequence
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from json import dumps
 
-from boto3 import Session
+from botocore.client import BaseClient
 from botocore.exceptions import ClientError
 
-from . import config
+from . import clients, config
 from .exceptions import (BucketAccessDenied, BucketNotFound, DirectoryNotFound,
-                         ImproperlyConfiguredError)
+                         FileNotFound, ImproperlyConfiguredError,
+                         InvalidBackendError, InvalidDumpFormatError,
+                         InvalidListingModeError)
+from .cache import cache_when_complete
+from .checkpoint import DEFAULT_CHECKPOINT_INTERVAL, WalkCheckpoint
+from .index import write_index
+from .listing import (build_index, iter_pages, iter_sharded_pages,
+                      sample_boundaries, split_page)
 from .models import Directory, File
-from .utils import cached_property, normalize_path
+from .retry import error_code
+from .snapshot import Snapshot
+from .stats import TreeStats
+from .utils import (GLOB_WILDCARDS, glob_literal_prefix, glob_to_regex,
+                    normalize_path)
+
+# (access key, secret key, endpoint, bucket name) of the buckets that are
+# known to exist and be accessible, shared by all the trees in this process.
+_verified_buckets = set()
+
+# maximum number of ranges of a sharded tree listed at once, however many
+# boundaries it has
+MAX_SHARD_WORKERS = 16
+
+
+class _ThresholdExceeded(Exception):
+    pass
 
 
 class S3Tree(Sequence):
@@ -21,7 +49,12 @@ class S3Tree(Sequence):
     Create an S3Tree object to access the tree at the given path.
 
     You can iterate upon this object to access directories and files in this
-    tree.
+    tree. The tree is listed one page at a time, as its entries are accessed,
+    so the first entries are available as soon as the first page arrives.
+    The entries are in the order of the pages, with the directories then the
+    files of each page, so a tree larger than a page doesn't hold all of
+    its directories before all of its files. `directories` and `files` hold
+    them separately.
 
     Usage:
         >>> tree = S3Tree(bucket_name='demo', path='/css')
@@ -38,103 +71,911 @@ class S3Tree(Sequence):
         aws_access_key_id (:object: str, optional): The AWS access key ID.
         aws_secret_access_key (:object: str, optional): The AWS secret
             access key.
+        page_size (:object: int, optional): Maximum number of entries
+            fetched in a single listing request. Defaults to the S3 default
+            of 1000.
+        lazy (:object: bool, optional): If `True`, checking the bucket and
+            listing the tree are deferred until the entries of this tree
+            are first accessed, so creating the tree makes no requests.
+            Errors like `BucketNotFound` are raised on that first access
+            instead. Defaults to `False`.
+        region_name (:object: str, optional): The AWS region of the bucket.
+        endpoint_url (:object: str, optional): URL of an S3 compatible
+            endpoint to use instead of AWS.
+        listing (:object: str, optional): How the tree is listed. `level`
+            lists one directory per request. `flat` lists every key under
+            the path at once, and builds the whole hierarchy in memory, so
+            that `Directory.get_tree()` and `walk()` need no more requests.
+            `auto` lists the tree flat if it holds at most
+            `config.flat_listing_threshold` keys, and by level otherwise.
+            Defaults to `level`.
+        cache (:object: s3tree.cache.ListingCache, optional): Cache in
+            which the listings of this tree and its child trees are stored.
+            Fresh listings are served from the cache without any request.
+            Defaults to `config.listing_cache`.
+        body_cache (:object: s3tree.cache.MemoryCache, optional): Cache in
+            which the contents of the files read with `File.read()` and
+            `File.read_bytes()` are stored. Defaults to `config.body_cache`.
+        shards (:object: int, optional): List the tree in this many ranges
+            of keys at once, which is faster for very large trees. The keys
+            separating the ranges are sampled with a few single-key listings
+            first. Defaults to `None`, which lists the tree sequentially.
+        shard_boundaries (:object: list, optional): Keys separating the
+            ranges listed at once, instead of sampling them. Boundaries
+            which are not under the path of a tree are ignored by it.
+        retry_policy (:object: s3tree.retry.RetryPolicy, optional): Policy
+            for retrying the requests of this tree and its files which fail
+            with a transient error. Defaults to `config.retry_policy`.
+        metrics (:object: s3tree.metrics.Metrics, optional): Metrics in
+            which the requests made by this tree, its child trees and its
+            files, and the lookups in their caches, are recorded. Defaults
+            to `config.metrics`.
+        backend (:object: s3tree.backends.Backend, optional): Storage to
+            use in place of S3, like `s3tree.backends.MemoryBackend`. No
+            credentials are needed with a backend, and the caches and the
+            buckets checked are shared by the trees using the same
+            `meta.endpoint_url`. Use credentials rather than a backend to
+            access S3. Defaults to `config.backend`, or S3 if there is none.
     """
 
-    BOTO3_S3_RESOURCE_ID = "s3"
+    BOTO3_S3_RESOURCE_ID = clients.BOTO3_S3_RESOURCE_ID
 
     KEY_DELIMITER = "/"
 
+    LISTING_MODES = ("level", "flat", "auto")
+
+    DUMP_FORMATS = ("json", "ndjson")
+
     def __init__(
-        self, bucket_name, path=None, aws_access_key_id=None, aws_secret_access_key=None
+        self,
+        bucket_name,
+        path=None,
+        aws_access_key_id=None,
+        aws_secret_access_key=None,
+        page_size=None,
+        lazy=False,
+        region_name=None,
+        endpoint_url=None,
+        listing="level",
+        cache=None,
+        body_cache=None,
+        shards=None,
+        shard_boundaries=None,
+        retry_policy=None,
+        metrics=None,
+        backend=None,
+        _index=None,
     ):
         # try to get the access key and secret key either from this object's
         # init, or from the global config.
         self._access_key = aws_access_key_id or config.aws_access_key_id
         self._secret_key = aws_secret_access_key or config.aws_secret_access_key
+        self.backend = config.backend if backend is None else backend
 
-        if not (self._access_key and self._secret_key):
+        if self.backend is None and not (self._access_key and self._secret_key):
             raise ImproperlyConfiguredError
 
-        # create a session using the credentials
-        session = Session(
-            aws_access_key_id=self._access_key, aws_secret_access_key=self._secret_key
+        # trees using a backend share their caches by its endpoint, which a
+        # boto3 client shares with all the other credentials
+        if isinstance(self.backend, BaseClient):
+            raise InvalidBackendError(self.backend.meta.endpoint_url)
+
+        self.region_name = region_name or config.region_name
+        self.endpoint_url = endpoint_url or config.endpoint_url
+
+        if self.backend is not None:
+            self.s3 = None
+            self.client = self.backend
+            self.endpoint_url = self.backend.meta.endpoint_url
+        else:
+            # get an S3 resource from the pool shared by all the trees
+            self.s3 = clients.get_resource(
+                self._access_key,
+                self._secret_key,
+                region_name=self.region_name,
+                endpoint_url=self.endpoint_url,
+                max_pool_connections=config.max_pool_connections,
+            )
+            self.client = self.s3.meta.client
+        self.retry_policy = (
+            config.retry_policy if retry_policy is None else retry_policy
         )
+        self.metrics = config.metrics if metrics is None else metrics
 
-        # create an S3 resource
-        self.s3 = session.resource(self.BOTO3_S3_RESOURCE_ID)
-        self.client = self.s3.meta.client
+        # every attempt of a retried request is recorded
+        if self.metrics is not None:
+            self.client = self.metrics.wrap(self.client)
+
+        if self.retry_policy is not None:
+            self.client = self.retry_policy.wrap(self.client)
 
-        # ensure that the bucket exists, and then set the bucket name
-        self.__ensure_bucket_exists(bucket_name)
         self.bucket_name = bucket_name
 
         # set the base path
         self.path = normalize_path(path)
+        self.page_size = page_size
+        self.lazy = lazy
+
+        if listing not in self.LISTING_MODES:
+            raise InvalidListingModeError(listing)
+
+        self.listing = listing
+        self.cache = config.listing_cache if cache is None else cache
+        self.body_cache = config.body_cache if body_cache is None else body_cache
+        self.shards = shards
+        self.shard_boundaries = shard_boundaries
 
-        # set containers
-        self.directories = []
-        self.files = []
+        # hierarchy of the flat listing this tree is part of, if any
+        self.__index = _index
 
-        # get the base tree and prepare the iterable
-        self.__tree = self.__fetch_tree()
+        # set containers, which are filled as the pages of the tree are listed
+        self.__directories = []
+        self.__files = []
+        self.__tree = []
+
+        # continuation token of the next page that has not been loaded yet
+        self.__next_token = None
+
+        # pages of the tree, created when the tree is first loaded
+        self.__pages = None
+
+        if not lazy:
+            self.__load()
 
     def __getitem__(self, index):
+        self.__load()
+
+        if isinstance(index, slice) or index < 0:
+            self.__load_all()
+        else:
+            while index >= len(self.__tree) and self.__load_page():
+                pass
+
         return self.__tree[index]
 
     def __len__(self):
+        self.__load_all()
         return len(self.__tree)
 
-    def __fetch_tree(self):
-        # retrieve the tree at the current path
-        tree = self.client.list_objects_v2(
-            Bucket=self.bucket_name, Delimiter=self.KEY_DELIMITER, Prefix=self.path
+    def __list_pages(self, prefix=None, continuation_token=None):
+        return iter_pages(
+            self.client,
+            self.bucket_name,
+            prefix=self.path if prefix is None else prefix,
+            delimiter=self.KEY_DELIMITER,
+            page_size=self.page_size,
+            continuation_token=continuation_token,
         )
 
-        tree_size = tree.get("KeyCount")
+    def __fetch_tree(self):
+        """Iterate over the pages of the tree at the current path."""
+        if self.__index is None and self.listing != "level":
+            self.__index = self.__fetch_index()
+
+        if self.__index is not None:
+            # paged like a listing of the directory, so that the entries are
+            # in the same order whichever way the tree is listed
+            pages = split_page(self.__index.get(self.path, {}), self.page_size)
+        else:
+            pages = self.__list_tree()
+
+        first_page = next(pages)
 
         # if the current tree is empty and we are not accessing the bucket
         # root, throw an error since this directory does not exist.
-        if not tree_size and self.path != self.KEY_DELIMITER:
+        if not first_page.get("KeyCount") and self.path != self.KEY_DELIMITER:
             raise DirectoryNotFound(self.path)
 
-        # otherwise, prepare the tree and return the list
+        yield first_page
+
+        for page in pages:
+            yield page
+
+    def __fetch_index(self):
+        """List every key under the current path, and return the hierarchy
+        built from them. In `auto` mode, returns `None` as soon as there are
+        too many keys for a flat listing to be worth it."""
+        pages = self.__list_tree(flat=True)
+
+        if self.listing == "auto":
+            pages = self.__within_threshold(pages, config.flat_listing_threshold)
+
+        try:
+            return build_index(pages, self.path, self.KEY_DELIMITER)
+        except _ThresholdExceeded:
+            return None
+
+    def __list_tree(self, flat=False):
+        """Iterate over the pages listing the current path, either by level
+        or flat. A fresh listing in the cache is used if there is one.
+        Otherwise, the bucket is checked and the path listed, and the
+        listing is cached once complete."""
+        delimiter = None if flat else self.KEY_DELIMITER
+
+        # a cached listing is served without checking the bucket, so only
+        # to trees using the credentials it was listed with
+        key = (
+            self._access_key,
+            self.endpoint_url,
+            self.bucket_name,
+            self.path,
+            delimiter,
+        )
+
+        if self.cache is not None:
+            pages = self.cache.get(key)
+
+            if self.metrics is not None:
+                self.metrics.record_cache("listing", pages is not None)
+
+            if pages is not None:
+                return iter(pages)
+
+        self.__ensure_bucket_exists(self.bucket_name)
+        pages = self.__iter_pages(self.path, delimiter)
+
+        if self.cache is not None:
+            pages = cache_when_complete(self.cache, key, pages)
+
+        return pages
+
+    def __iter_pages(self, prefix, delimiter=None):
+        """Iterate over the pages listing `prefix`, in shards if this tree
+        is sharded."""
+        if not (self.shards or self.shard_boundaries):
+            return iter_pages(
+                self.client,
+                self.bucket_name,
+                prefix=prefix,
+                delimiter=delimiter,
+                page_size=self.page_size,
+            )
+
+        if self.shard_boundaries:
+            boundaries = [b for b in self.shard_boundaries if b.startswith(prefix)]
         else:
-            return self.__prepare_tree(tree)
+            boundaries = sample_boundaries(
+                self.client, self.bucket_name, self.shards, prefix=prefix
+            )
+
+        return iter_sharded_pages(
+            self.client,
+            self.bucket_name,
+            boundaries,
+            prefix=prefix,
+            delimiter=delimiter,
+            page_size=self.page_size,
+            max_workers=min(len(boundaries) + 1, MAX_SHARD_WORKERS),
+        )
+
+    @staticmethod
+    def __within_threshold(pages, threshold):
+        count = 0
+
+        for page in pages:
+            count += page.get("KeyCount", 0)
+
+            if count > threshold:
+                raise _ThresholdExceeded
+
+            yield page
+
+    def __load(self):
+        """Get the first page of the tree, unless that has already been done.
+        The rest is fetched on demand."""
+        if self.__pages is not None:
+            return
+
+        self.__pages = self.__fetch_tree()
+
+        try:
+            self.__load_page()
+        except Exception:
+            # let the next access retry, rather than see an empty tree
+            self.__pages = None
+            raise
+
+    def __load_page(self):
+        """Load the next page of the tree. Returns `False` if all the pages
+        have already been loaded."""
+        try:
+            page = next(self.__pages)
+        except StopIteration:
+            return False
+
+        directories, files = self.__prepare_tree(page)
+        self.__directories.extend(directories)
+        self.__files.extend(files)
+        self.__tree.extend(directories + files)
+
+        self.__next_token = (
+            page.get("NextContinuationToken") if page.get("IsTruncated") else None
+        )
+        return True
+
+    def __load_all(self):
+        self.__load()
+
+        while self.__load_page():
+            pass
 
     def __prepare_tree(self, data):
-        """Takes the tree data and returns a list representing the tree object."""
-        directories = data.get("CommonPrefixes", [])
-        files = data.get("Contents", [])
+        """Takes a page of the tree data and returns the lists of directories
+        and files in it."""
+        directories = [Directory(d, self) for d in data.get("CommonPrefixes", [])]
+        files = [File(f, self) for f in data.get("Contents", [])]
+        return directories, files
+
+    def iter_entries(self):
+        """Iterate over the directories and files in this tree, page by page.
+
+        Entries that have already been loaded are yielded first. The rest of
+        the tree is streamed from S3 without being stored on this object, so
+        even very large trees can be walked in bounded memory.
+        """
+        self.__load()
+        index = 0
+
+        while True:
+            while index < len(self.__tree):
+                yield self.__tree[index]
+                index += 1
+
+            if self.__next_token is not None:
+                break
+
+            # pages served from a cache or listed in shards have no
+            # continuation token, and are loaded like any other
+            if not self.__load_page():
+                return
+
+        for page in self.__list_pages(continuation_token=self.__next_token):
+            directories, files = self.__prepare_tree(page)
+
+            for entry in directories + files:
+                yield entry
+
+    def walk(
+        self,
+        max_depth=None,
+        max_workers=8,
+        checkpoint=None,
+        checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL,
+    ):
+        """Recursively walk this tree, like `os.walk`.
+
+        Yields a `(path, directories, files)` tuple for this tree and every
+        directory under it. The directories of a level are listed
+        concurrently on a pool of threads, and are yielded in the order in
+        which their listings complete rather than top-down. A directory
+        with more entries than fit in a single listing page is yielded once
+        for every page, so that memory stays bounded.
+
+        With `checkpoint`, the listings that remain to be made are saved to
+        a file after a page has been processed, at most once every
+        `checkpoint_interval` seconds, and a walk with the same checkpoint
+        file resumes from there instead of starting over. The pages
+        processed since the last save are yielded again on resume. The file
+        is removed once the walk is complete.
+
+        Usage:
+            >>> for path, directories, files in tree.walk(max_workers=16):
+            ...     print(path, len(files))
+            >>> for path, directories, files in tree.walk(checkpoint='walk.json'):
+            ...     inventory.add(files)
+
+        Args:
+            max_depth (:object: int, optional): Don't descend more than
+                this many levels below this tree. `0` only lists this tree.
+                Defaults to no limit.
+            max_workers (:object: int, optional): Maximum number of listing
+                requests in flight at once. Defaults to 8.
+            checkpoint (:object: str, optional): Path of a file in which
+                the progress of the walk is saved. Walks of trees served
+                from a flat listing are never checkpointed, since they make
+                no requests.
+            checkpoint_interval (:object: float, optional): Minimum number
+                of seconds between two saves of the checkpoint. Defaults to
+                10.
+        """
+        self.__ensure_bucket_exists(self.bucket_name)
+
+        if self.listing != "level":
+            self.__load()
+
+        if self.__index is not None:
+            for entry in self.__walk_index(max_depth):
+                yield entry
+            return
+
+        if checkpoint is not None:
+            checkpoint = WalkCheckpoint(
+                checkpoint, self.bucket_name, self.path, checkpoint_interval
+            )
+
+        # listings waiting to be made, as (prefix, continuation token, depth).
+        # A checkpoint with none left is of a walk that was complete.
+        saved = checkpoint.load() if checkpoint is not None else None
+        pending = deque([(self.path, None, 0)] if saved is None else saved)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                while pending and len(running) < max_workers:
+                    prefix, token, depth = pending.popleft()
+                    future = executor.submit(
+                        next, self.__list_pages(prefix, continuation_token=token)
+                    )
+                    running[future] = (prefix, token, depth)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    prefix, token, depth = running.pop(future)
+                    page = future.result()
+
+                    # the base of the walk must exist, like in `S3Tree`
+                    if (
+                        not (token or page.get("KeyCount"))
+                        and prefix == self.path
+                        and self.path
+                    ):
+                        raise DirectoryNotFound(self.path)
+
+                    directories, files = self.__prepare_tree(page)
+
+                    if page.get("IsTruncated"):
+                        pending.append((prefix, page["NextContinuationToken"], depth))
+
+                    if max_depth is None or depth < max_depth:
+                        pending.extend((d.path, None, depth + 1) for d in directories)
+
+                    yield prefix, directories, files
+
+                    # the page has been processed, listings still running
+                    # are made again on resume
+                    if checkpoint is not None and checkpoint.due():
+                        checkpoint.save(list(pending) + list(running.values()))
+
+        if checkpoint is not None:
+            checkpoint.clear()
+
+    def read_many(
+        self,
+        files=None,
+        max_workers=8,
+        as_completed=True,
+        max_inflight_bytes=None,
+        encoding="utf-8",
+    ):
+        """Read many files concurrently.
+
+        Yields a `(file, contents)` tuple for every file. If a file could
+        not be read, the exception raised while reading it is yielded in
+        place of its contents, and the other files are still read.
+
+        Usage:
+            >>> is_json = lambda f: f.name.endswith('.json')
+            >>> for file_obj, contents in tree.read_many(is_json):
+            ...     if not isinstance(contents, Exception):
+            ...         print(file_obj.name, len(contents))
+
+        Args:
+            files (:object: iterable or callable, optional): The files to read,
+                or a predicate selecting which files of this tree to read.
+                Defaults to all the files of this tree.
+            max_workers (:object: int, optional): Maximum number of files
+                read at once. Defaults to 8.
+            as_completed (:object: bool, optional): If `True`, files are
+                yielded as soon as they are read, otherwise in the order in
+                which they were given. Defaults to `True`.
+            max_inflight_bytes (:object: int, optional): Don't start reading
+                a file while the files read but not yet yielded would exceed
+                this many bytes, unless there are none. Defaults to no limit.
+            encoding (:object: str, optional): Encoding used to decode the
+                contents. If `None`, the contents are returned as bytes.
+                Defaults to `utf-8`.
+        """
+        if files is None:
+            files = self.files
+        elif callable(files):
+            predicate = files
+            files = (f for f in self.files if predicate(f))
+
+        def read(file_obj):
+            try:
+                return file_obj.read_bytes(encoding=encoding)
+            except Exception as exc:
+                return exc
+
+        files = iter(files)
+        next_file = next(files, None)
+        running = {}
+        submitted = deque()
+        inflight_bytes = 0
 
-        for d in directories:
-            self.directories.append(Directory(d, self))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while next_file is not None or running:
+                while next_file is not None and len(running) < max_workers:
+                    size = next_file.size_in_bytes or 0
 
-        for f in files:
-            self.files.append(File(f, self))
+                    if (
+                        running
+                        and max_inflight_bytes is not None
+                        and inflight_bytes + size > max_inflight_bytes
+                    ):
+                        break
 
-        return self.directories + self.files
+                    future = executor.submit(read, next_file)
+                    running[future] = next_file
+                    inflight_bytes += size
+                    next_file = next(files, None)
+
+                    if not as_completed:
+                        submitted.append(future)
+
+                if as_completed:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                else:
+                    done = [submitted.popleft()]
+
+                for future in done:
+                    file_obj = running.pop(future)
+                    inflight_bytes -= file_obj.size_in_bytes or 0
+                    yield file_obj, future.result()
+
+    def __iter_all_files(self, prefix=None, start_after=None):
+        """Iterate over all the files under this tree, or under `prefix`, at
+        any depth, with a flat listing."""
+        self.__ensure_bucket_exists(self.bucket_name)
+        prefix = self.path if prefix is None else prefix
+
+        if start_after is None:
+            pages = self.__iter_pages(prefix)
+        else:
+            pages = iter_pages(
+                self.client,
+                self.bucket_name,
+                prefix=prefix,
+                page_size=self.page_size,
+                start_after=start_after,
+            )
+
+        for page in pages:
+            for data in page.get("Contents", []):
+                yield File(data, self)
+
+    def snapshot(self):
+        """Take a snapshot of all the files under this tree, at any depth,
+        to find what changed with `diff()` later on.
+
+        Returns:
+            s3tree.snapshot.Snapshot
+        """
+        return Snapshot.from_files(self.bucket_name, self.path, self.__iter_all_files())
+
+    def diff(self, previous, new_keys_only=False):
+        """Find the files under this tree, at any depth, which were added,
+        removed or modified since a previous snapshot of it. Files are
+        modified if their ETag or size changed.
+
+        Usage:
+            >>> changes = tree.diff(snapshot)
+            >>> for file_obj in changes.added + changes.modified:
+            ...     process(file_obj)
+            >>> snapshot = changes.snapshot
+
+        Args:
+            previous (s3tree.snapshot.Snapshot): Snapshot of this tree.
+            new_keys_only (:object: bool, optional): If `True`, only list the
+                keys after the last key of the snapshot, skipping all the
+                pages before it. Only new files are found that way, which is
+                enough for trees where files are only ever added with
+                increasing keys, like time stamped logs. Defaults to `False`.
+
+        Returns:
+            s3tree.snapshot.TreeDiff
+        """
+        start_after = previous.last_key if new_keys_only else None
+        files = self.__iter_all_files(start_after=start_after)
+        return previous.diff(files, new_keys_only=new_keys_only)
+
+    def stats(self, recursive=True):
+        """Compute the total size and number of the files in this tree, with
+        breakdowns by extension, storage class and subdirectory.
+
+        With `recursive`, every file under this tree at any depth is counted
+        in a single pass over a flat listing, which is streamed so that
+        even huge trees are summarized in bounded memory.
+
+        Usage:
+            >>> stats = tree.stats()
+            >>> stats.size
+            '1.49 GB'
+            >>> stats.by_storage_class['GLACIER']
+            {'files': 1200, 'bytes': 1073741824}
+
+        Args:
+            recursive (:object: bool, optional): If `False`, only count the
+                directories and files directly in this tree. Defaults to
+                `True`.
+
+        Returns:
+            s3tree.stats.TreeStats
+        """
+        stats = TreeStats(self.path, self.KEY_DELIMITER)
+
+        if recursive:
+            for file_obj in self.__iter_all_files():
+                stats.add_file(file_obj)
+            return stats
+
+        for entry in self.iter_entries():
+            if isinstance(entry, Directory):
+                stats.add_directory(entry.path)
+            else:
+                stats.add_file(entry)
+
+        return stats
+
+    def glob(self, pattern):
+        """Iterate over the files under this tree whose path, relative to
+        this tree, matches a glob pattern.
+
+        `*` and `?` match within a directory, `[...]` matches a set of
+        characters, and a `**` segment matches any number of directories.
+        Only the relevant part of the bucket is listed: the literal part of
+        the pattern is used as the prefix of the listings, directories which
+        cannot match are never listed, and a flat listing is only used from
+        the first `**` segment.
+
+        Usage:
+            >>> for file_obj in tree.glob('**/*.js'): ...
+            >>> for file_obj in tree.glob('logs/2018-*/*.gz'): ...
+
+        Args:
+            pattern (str): The glob pattern.
+        """
+        pattern = pattern.lstrip(self.KEY_DELIMITER)
+        regex = glob_to_regex(pattern, self.KEY_DELIMITER)
+
+        self.__ensure_bucket_exists(self.bucket_name)
+
+        for file_obj in self.__glob(self.path, pattern.split(self.KEY_DELIMITER)):
+            if regex.match(file_obj.path[len(self.path) :]):
+                yield file_obj
+
+    def __glob(self, prefix, segments):
+        # descend through the literal directories without any request
+        while len(segments) > 1 and not any(c in segments[0] for c in GLOB_WILDCARDS):
+            prefix += segments[0] + self.KEY_DELIMITER
+            segments = segments[1:]
+
+        segment = segments[0]
+        literal_prefix = prefix + glob_literal_prefix(segment)
+
+        if "**" in segment:
+            for file_obj in self.__iter_all_files(prefix=literal_prefix):
+                yield file_obj
+            return
+
+        pages = iter_pages(
+            self.client,
+            self.bucket_name,
+            prefix=literal_prefix,
+            delimiter=self.KEY_DELIMITER,
+            page_size=self.page_size,
+        )
+
+        if len(segments) == 1:
+            for page in pages:
+                for data in page.get("Contents", []):
+                    yield File(data, self)
+            return
+
+        # only descend into the directories matching this segment
+        regex = glob_to_regex(segment, self.KEY_DELIMITER)
+
+        for page in pages:
+            for data in page.get("CommonPrefixes", []):
+                name = data["Prefix"][len(prefix) : -len(self.KEY_DELIMITER)]
+
+                if regex.match(name):
+                    for file_obj in self.__glob(data["Prefix"], segments[1:]):
+                        yield file_obj
+
+    def find(
+        self, predicate=None, min_size=None, modified_after=None, storage_class=None
+    ):
+        """Iterate over the files under this tree, at any depth, which match
+        all the given criteria. The files are filtered as they are listed.
+
+        Usage:
+            >>> big_files = tree.find(min_size=1024 * 1024 * 1024)
+            >>> recent = tree.find(modified_after=datetime(2018, 6, 1, tzinfo=tzutc()))
+
+        Args:
+            predicate (:object: callable, optional): A function which takes
+                a `File` and returns whether it should be included.
+            min_size (:object: int, optional): Minimum size, in bytes.
+            modified_after (:object: datetime, optional): Only include files
+                modified after this time. Must be timezone aware.
+            storage_class (:object: str, optional): Only include files with
+                this storage class, like `STANDARD` or `GLACIER`.
+        """
+        for file_obj in self.__iter_all_files():
+            if min_size is not None and file_obj.size_in_bytes < min_size:
+                continue
+
+            if modified_after is not None and file_obj.last_modified <= modified_after:
+                continue
+
+            if storage_class is not None and file_obj.storage_class != storage_class:
+                continue
+
+            if predicate is not None and not predicate(file_obj):
+                continue
+
+            yield file_obj
+
+    def fetch_metadata(self, files=None, max_workers=8, cache=None):
+        """Fetch the content type and user metadata of files concurrently,
+        with a HEAD request for every file, and set them as the
+        `content_type` and `metadata` of the files, so that their
+        `file_type` is detected from their actual content type. The
+        contents of the files are never downloaded.
+
+        If the metadata of a file could not be fetched, the other files are
+        still fetched, and the file is returned with the exception raised.
+        With a cache, the metadata is cached by ETag, so fetching it again
+        for files which have not changed makes no requests.
+
+        Usage:
+            >>> errors = tree.fetch_metadata(max_workers=32)
+            >>> tree.files[0].metadata
+            {'owner': 'web'}
+
+        Args:
+            files (:object: iterable, optional): The files whose metadata
+                should be fetched. Defaults to all the files of this tree.
+            max_workers (:object: int, optional): Maximum number of requests
+                in flight at once. Defaults to 8.
+            cache (:object: s3tree.cache.MemoryCache, optional): Cache in
+                which the metadata is stored. Defaults to
+                `config.metadata_cache`.
+
+        Returns:
+            A list of `(file, exception)` tuples, for the files whose
+            metadata could not be fetched.
+        """
+        if files is None:
+            files = self.files
+
+        if cache is None:
+            cache = config.metadata_cache
+
+        def fetch(file_obj):
+            key = (
+                self._access_key,
+                self.endpoint_url,
+                self.bucket_name,
+                file_obj.path,
+                file_obj.etag,
+            )
+            cached = None
+
+            # files without an ETag can't be told apart from newer versions
+            if cache is not None and file_obj.etag:
+                cached = cache.get(key)
+
+                if self.metrics is not None:
+                    self.metrics.record_cache("metadata", cached is not None)
+
+            if cached is None:
+                try:
+                    response = self.client.head_object(
+                        Bucket=self.bucket_name, Key=file_obj.path
+                    )
+                except Exception as exc:
+                    if isinstance(exc, ClientError) and error_code(exc) in (
+                        "404",
+                        "NoSuchKey",
+                        "NotFound",
+                    ):
+                        exc = FileNotFound(file_obj.path)
+
+                    return file_obj, exc
+
+                cached = (response.get("ContentType"), response.get("Metadata", {}))
+
+                if cache is not None and file_obj.etag:
+                    cache.set(key, cached)
+
+            file_obj.content_type = cached[0]
+            file_obj.metadata = dict(cached[1])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return [error for error in executor.map(fetch, files) if error]
+
+    def __walk_index(self, max_depth):
+        pending = deque([(self.path, 0)])
+
+        while pending:
+            prefix, depth = pending.popleft()
+            directories, files = self.__prepare_tree(self.__index[prefix])
+
+            if max_depth is None or depth < max_depth:
+                pending.extend((d.path, depth + 1) for d in directories)
+
+            yield prefix, directories, files
 
     def __ensure_bucket_exists(self, bucket_name):
         """Check if the bucket exists and the credentials provided have
         access to it. Otherwise, raise a proper exception.
+
+        The result is remembered for the process, so the check is only made
+        once for every set of credentials and bucket.
         """
+        key = (self._access_key, self._secret_key, self.endpoint_url, bucket_name)
+
+        if key in _verified_buckets:
+            return
 
         try:
             self.client.head_bucket(Bucket=bucket_name)
         except ClientError as exc:
             # check the error code in the exception and raise a proper
-            # exception
-            error_code = int(exc.response["Error"]["Code"])
+            # exception. S3 compatible services may return names instead of
+            # HTTP status codes.
+            code = error_code(exc)
 
-            if error_code == 404:
+            if code in ("404", "NoSuchBucket", "NotFound"):
                 raise BucketNotFound(bucket_name)
 
-            elif error_code == 403:
+            elif code in ("403", "AccessDenied", "Forbidden"):
                 raise BucketAccessDenied(bucket_name)
 
             else:
                 raise exc
 
+        _verified_buckets.add(key)
+
+    def _subtree(self, path):
+        """Returns the tree at `path` in this bucket, created with the same
+        options as this tree. If this tree was listed flat, the new tree is
+        served from the same listing."""
+        return self.__class__(
+            bucket_name=self.bucket_name,
+            path=path,
+            aws_access_key_id=self._access_key,
+            aws_secret_access_key=self._secret_key,
+            page_size=self.page_size,
+            lazy=self.lazy,
+            region_name=self.region_name,
+            endpoint_url=self.endpoint_url,
+            listing=self.listing,
+            cache=self.cache,
+            body_cache=self.body_cache,
+            shards=self.shards,
+            shard_boundaries=self.shard_boundaries,
+            retry_policy=self.retry_policy,
+            metrics=self.metrics,
+            backend=self.backend,
+            _index=self.__index,
+        )
+
+    @property
+    def directories(self):
+        """List of all the directories in this tree."""
+        self.__load_all()
+        return self.__directories
+
+    @property
+    def files(self):
+        """List of all the files in this tree."""
+        self.__load_all()
+        return self.__files
+
     @property
     def num_files(self):
         """Returns the number of files in this tree."""
@@ -145,15 +986,61 @@ class S3Tree(Sequence):
         """Returns the number of directories in this tree."""
         return len(self.directories)
 
-    @cached_property
-    def as_json(self):
-        """JSON representation of this tree."""
-        obj_list = []
+    def write_index(self, path):
+        """Write the index of all the files under this tree to a file, to
+        open it instantly later as an `s3tree.index.IndexedTree`. See
+        `s3tree.index.write_index()`.
 
-        for directory in self.directories:
-            obj_list.append(directory.as_dict)
+        Returns:
+            The number of files indexed.
+        """
+        return write_index(self, path)
 
-        for file_obj in self.files:
-            obj_list.append(file_obj.as_dict)
+    def dump(self, fp, format="json", recursive=False):
+        """Write the JSON representation of the entries of this tree to a
+        file object, as they are listed.
 
-        return dumps(obj_list)
+        Entries are written one at a time, and the pages of the tree which
+        have not been loaded yet are streamed without being stored, so that
+        even very large trees are exported in constant memory.
+
+        Usage:
+            >>> with open('inventory.ndjson', 'w') as fp:
+            ...     tree.dump(fp, format='ndjson', recursive=True)
+
+        Args:
+            fp: A text file object.
+            format (:object: str, optional): `json` writes a single array,
+                like `as_json`. `ndjson` writes an object per line. Defaults
+                to `json`.
+            recursive (:object: bool, optional): If `True`, all the files
+                under this tree at any depth are written, using a flat
+                listing, instead of the directories and files in this tree.
+                Defaults to `False`.
+        """
+        if format not in self.DUMP_FORMATS:
+            raise InvalidDumpFormatError(format)
+
+        entries = self.__iter_all_files() if recursive else self.iter_entries()
+
+        if format == "ndjson":
+            for entry in entries:
+                fp.write(dumps(entry.as_dict))
+                fp.write("\n")
+            return
+
+        fp.write("[")
+
+        for i, entry in enumerate(entries):
+            if i:
+                fp.write(", ")
+            fp.write(dumps(entry.as_dict))
+
+        fp.write("]")
+
+    @property
+    def as_json(self):
+        """JSON representation of this tree, with its entries in the order of
+        `iter_entries()`. Use `dump()` to export large trees."""
+        self.__load_all()
+        return dumps([obj.as_dict for obj in self.__tree])
@@ -39,3 +39,56 @@ class DirectoryNotFound(Exception):
     def __init__(self, dir_name):
         message = "Directory could not be found: {}".format(dir_name)
         super(DirectoryNotFound, self).__init__(message)
+
+
+class InvalidListingModeError(Exception):
+    def __init__(self, mode):
+        message = (
+            "Invalid listing mode: {}. Must be one of level, flat or auto.".format(mode)
+        )
+        super(InvalidListingModeError, self).__init__(message)
+
+
+class DownloadVerificationError(Exception):
+    def __init__(self, file_name):
+        message = "Downloaded contents do not match the ETag of the file: {}".format(
+            file_name
+        )
+        super(DownloadVerificationError, self).__init__(message)
+
+
+class InvalidDumpFormatError(Exception):
+    def __init__(self, dump_format):
+        message = "Invalid dump format: {}. Must be one of json or ndjson.".format(
+            dump_format
+        )
+        super(InvalidDumpFormatError, self).__init__(message)
+
+
+class InvalidCheckpointError(Exception):
+    def __init__(self, path):
+        message = "Checkpoint was not made by a walk of this tree: {}".format(path)
+        super(InvalidCheckpointError, self).__init__(message)
+
+
+class InvalidIndexError(Exception):
+    def __init__(self, path):
+        message = "Not a valid index file: {}".format(path)
+        super(InvalidIndexError, self).__init__(message)
+
+
+class TreeNotLoadedError(Exception):
+    def __init__(self, bucket_name):
+        message = "The tree must be awaited before accessing its entries: {}".format(
+            bucket_name
+        )
+        super(TreeNotLoadedError, self).__init__(message)
+
+
+class InvalidBackendError(Exception):
+    def __init__(self, endpoint_url):
+        message = (
+            "A boto3 client can't be used as a backend, use credentials "
+            "instead: {}".format(endpoint_url)
+        )
+        super(InvalidBackendError, self).__init__(message)
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Binary index files of trees, which are opened instantly by memory
+mapping them.
+
+An index file holds every file under a tree, sorted by key like S3 lists
+them. It is made of a fixed-size header, an array of fixed-size records,
+one for each file, the strings referred to by the records, and a JSON
+trailer with the name of the bucket, the path of the tree and the storage
+classes. Since the records are sorted, the files under any directory are
+a contiguous range of records, found with a binary search, and a whole
+subdirectory can be skipped with another one. Trees are read from the file
+without loading it, and processes opening the same file share its pages
+through the page cache.
+"""
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from collections import deque
+from datetime import datetime
+
+try:
+    from collections.abc import Sequence
+except ImportError:  # pragma: no cover
+    from collections import Sequence
+
+from dateutil.tz import tzutc
+
+from .exceptions import DirectoryNotFound, InvalidIndexError
+from .models import Directory, File
+from .utils import normalize_path, replace_file
+
+INDEX_MAGIC = b"S3TI"
+INDEX_FORMAT_VERSION = 1
+
+# magic, version, number of records, offset of the strings, offset of the
+# JSON trailer
+_HEADER = struct.Struct("<4sIQQQ")
+
+# offset and length of the key in the strings, size, modification time as a
+# timestamp, offset and length of the ETag in the strings, storage class
+_RECORD = struct.Struct("<QIQqQHB")
+
+# offset and length of the key, at the start of a record
+_RECORD_KEY = struct.Struct("<QI")
+
+KEY_DELIMITER = b"/"
+
+# no byte of a UTF-8 string is 0xff, so this sorts after any key starting
+# with a given prefix
+_AFTER_PREFIX = b"\xff"
+
+
+def _timestamp(last_modified):
+    delta = last_modified - datetime(1970, 1, 1, tzinfo=tzutc())
+    return delta.days * 86400 + delta.seconds
+
+
+def write_index(tree, path):
+    """Write the index of every file under a tree to a file.
+
+    The files are listed flat, and streamed to the file as they are listed,
+    so indexing a tree takes constant memory. The file is replaced
+    atomically, so processes never open a partially written index.
+
+    Usage:
+        >>> write_index(S3Tree(bucket_name='demo', path='/static'), 'static.idx')
+        >>> tree = IndexedTree('static.idx')
+
+    Args:
+        tree (S3Tree): The tree to index.
+        path (str): Path of the index file.
+
+    Returns:
+        The number of files indexed.
+    """
+    storage_classes = []
+    num_records = 0
+    previous_key = None
+    temp_path = path + ".tmp"
+
+    with open(temp_path, "wb") as fp, tempfile.TemporaryFile() as strings:
+        fp.write(b"\0" * _HEADER.size)
+
+        for file_obj in tree.find():
+            key = file_obj.path.encode("utf-8")
+            etag = (file_obj.etag or "").encode("utf-8")
+
+            if previous_key is not None and key <= previous_key:
+                raise ValueError("Keys are not sorted: {}".format(file_obj.path))
+
+            if file_obj.storage_class not in storage_classes:
+                storage_classes.append(file_obj.storage_class)
+
+            key_offset = strings.tell()
+            strings.write(key)
+            strings.write(etag)
+
+            fp.write(
+                _RECORD.pack(
+                    key_offset,
+                    len(key),
+                    file_obj.size_in_bytes or 0,
+                    _timestamp(file_obj.last_modified),
+                    key_offset + len(key),
+                    len(etag),
+                    storage_classes.index(file_obj.storage_class),
+                )
+            )
+            num_records += 1
+            previous_key = key
+
+        strings_offset = fp.tell()
+        strings.seek(0)
+        shutil.copyfileobj(strings, fp)
+
+        trailer_offset = fp.tell()
+        trailer = {
+            "bucket_name": tree.bucket_name,
+            "path": tree.path,
+            "storage_classes": storage_classes,
+        }
+        fp.write(json.dumps(trailer).encode("utf-8"))
+
+        fp.seek(0)
+        fp.write(
+            _HEADER.pack(
+                INDEX_MAGIC,
+                INDEX_FORMAT_VERSION,
+                num_records,
+                strings_offset,
+                trailer_offset,
+            )
+        )
+
+    replace_file(temp_path, path)
+    return num_records
+
+
+class _Index(object):
+    """A memory mapped index file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as fp:
+            try:
+                self.data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files can't be mapped
+                raise InvalidIndexError(path)
+
+        if len(self.data) < _HEADER.size:
+            raise InvalidIndexError(path)
+
+        magic, version, num_records, strings_offset, trailer_offset = _HEADER.unpack(
+            self.data[: _HEADER.size]
+        )
+
+        if magic != INDEX_MAGIC or version != INDEX_FORMAT_VERSION:
+            raise InvalidIndexError(path)
+
+        self.num_records = num_records
+        self.strings_offset = strings_offset
+
+        trailer = json.loads(self.data[trailer_offset:].decode("utf-8"))
+        self.bucket_name = trailer["bucket_name"]
+        self.path = trailer["path"]
+        self.storage_classes = trailer["storage_classes"]
+
+    def record(self, i):
+        return _RECORD.unpack_from(self.data, _HEADER.size + i * _RECORD.size)
+
+    def key(self, i):
+        key_offset, key_length = self.record(i)[:2]
+        start = self.strings_offset + key_offset
+        return self.data[start : start + key_length]
+
+    def lower_bound(self, key, lo=0):
+        """Returns the index of the first record whose key is not before
+        `key`."""
+        hi = self.num_records
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def file_data(self, i):
+        """Returns the record `i` like an object of a listing."""
+        record = self.record(i)
+        key_offset, key_length, size, mtime = record[:4]
+        etag_offset, etag_length, storage_class = record[4:]
+        start = self.strings_offset
+        key = self.data[start + key_offset : start + key_offset + key_length]
+        etag = self.data[start + etag_offset : start + etag_offset + etag_length]
+
+        return {
+            "Key": key.decode("utf-8"),
+            "ETag": etag.decode("utf-8") or None,
+            "Size": size,
+            "LastModified": datetime.fromtimestamp(mtime, tzutc()),
+            "StorageClass": self.storage_classes[storage_class],
+        }
+
+    def has_prefix(self, prefix):
+        """Returns whether any key starts with `prefix`."""
+        prefix = prefix.encode("utf-8")
+        index = self.lower_bound(prefix)
+        return index < self.num_records and self.key(index).startswith(prefix)
+
+    def children(self, prefix):
+        """Returns the direct subdirectories of `prefix`, and the indexes of
+        the records of its files."""
+        prefix = prefix.encode("utf-8")
+        index = self.lower_bound(prefix)
+        end = self.lower_bound(prefix + _AFTER_PREFIX, index)
+        directories = []
+        files = []
+        data = self.data
+        unpack_key = _RECORD_KEY.unpack_from
+
+        while index < end:
+            # look for a delimiter in the key without copying it, since
+            # most keys are files
+            key_offset, key_length = unpack_key(
+                data, _HEADER.size + index * _RECORD.size
+            )
+            start = self.strings_offset + key_offset
+            position = data.find(KEY_DELIMITER, start + len(prefix), start + key_length)
+
+            if position < 0:
+                files.append(index)
+                index += 1
+                continue
+
+            # skip all the files under this subdirectory at once
+            directory = data[start : position + 1]
+            directories.append(directory.decode("utf-8"))
+            index = self.lower_bound(directory + _AFTER_PREFIX, index)
+
+        return directories, files
+
+    def close(self):
+        self.data.close()
+
+
+class IndexedTree(Sequence):
+    """
+    Read-only tree served from an index file written with `write_index()`.
+
+    It can be used like an `S3Tree`: it holds the directories and files
+    under its path, and `Directory.get_tree()` returns the `IndexedTree` of
+    a subdirectory, from the same index file. Opening an index or a child
+    tree makes no requests, and only reads the parts of the file needed:
+    the records of a tree are found when it is first accessed, and its
+    directories and files are built from them when they are accessed.
+    Reading the contents of the files requires a client.
+
+    Usage:
+        >>> tree = IndexedTree('static.idx')
+        >>> css_tree = tree.get_tree('/static/css')
+        >>> tree = IndexedTree('static.idx', client=boto3.client('s3'))
+        >>> contents = tree.files[0].read()
+
+    Args:
+        index (str): Path of the index file.
+        path (:object: str, optional): The path of the tree in the bucket.
+            Defaults to the path of the tree that was indexed.
+        client (:object: optional): A boto3 S3 client, or a backend, with
+            which the contents of the files are read.
+    """
+
+    KEY_DELIMITER = "/"
+
+    def __init__(self, index, path=None, client=None):
+        self._index = index if isinstance(index, _Index) else _Index(index)
+        self.bucket_name = self._index.bucket_name
+        self.path = self._index.path if path is None else normalize_path(path)
+
+        # attributes used by the files to read their contents
+        self.client = client
+        self.endpoint_url = client.meta.endpoint_url if client else None
+        self.body_cache = None
+        self.metrics = None
+
+        if self.path != self._index.path and not self._index.has_prefix(self.path):
+            raise DirectoryNotFound(self.path)
+
+        # prefixes of the directories and indexes of the records of the
+        # files, from which they are built when accessed
+        self.__listing = None
+
+    @property
+    def __children(self):
+        if self.__listing is None:
+            self.__listing = self._index.children(self.path)
+
+        return self.__listing
+
+    def __directory(self, prefix):
+        return Directory({"Prefix": prefix}, self)
+
+    def __file(self, record):
+        return File(self._index.file_data(record), self)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("tree index out of range")
+
+        directories, files = self.__children
+
+        if index < len(directories):
+            return self.__directory(directories[index])
+
+        return self.__file(files[index - len(directories)])
+
+    def __len__(self):
+        directories, files = self.__children
+        return len(directories) + len(files)
+
+    def _subtree(self, path):
+        return self.__class__(self._index, path=path, client=self.client)
+
+    def get_tree(self, path):
+        """Returns the tree at `path`, from the same index."""
+        return self._subtree(path)
+
+    def iter_entries(self):
+        """Iterate over the directories and files in this tree."""
+        return iter(self)
+
+    def walk(self, max_depth=None):
+        """Recursively walk this tree, like `os.walk`. See `S3Tree.walk()`."""
+        pending = deque([(self, 0)])
+
+        while pending:
+            tree, depth = pending.popleft()
+            yield tree.path, tree.directories, tree.files
+
+            if max_depth is None or depth < max_depth:
+                pending.extend((d.get_tree(), depth + 1) for d in tree.directories)
+
+    @property
+    def directories(self):
+        """List of all the directories in this tree."""
+        return [self.__directory(prefix) for prefix in self.__children[0]]
+
+    @property
+    def files(self):
+        """List of all the files in this tree."""
+        return [self.__file(record) for record in self.__children[1]]
+
+    @property
+    def num_files(self):
+        """Number of files in this tree."""
+        return len(self.__children[1])
+
+    @property
+    def num_directories(self):
+        """Number of directories in this tree."""
+        return len(self.__children[0])
+
+    @property
+    def as_json(self):
+        """JSON representation of this tree."""
+        return json.dumps([obj.as_dict for obj in self])
+
+    def close(self):
+        """Unmap the index file. The trees opened from it can't be used
+        anymore."""
+        self._index.close()
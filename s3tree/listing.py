@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Low level helpers for listing keys in a bucket."""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+from six import reraise
+from six.moves import queue
+
+# number of entries in a listing page when no page size is given, like S3
+DEFAULT_PAGE_SIZE = 1000
+
+# keys are sampled among printable ASCII characters, keys after them always
+# fall in the last shard
+_MIN_CHAR = 32
+_MAX_CHAR = 126
+
+# pages listed ahead of the consumer in every range
+_PAGES_AHEAD = 2
+
+# marks the end of the pages of a range
+_DONE = object()
+
+
+def iter_pages(
+    client,
+    bucket_name,
+    prefix="",
+    delimiter=None,
+    page_size=None,
+    start_after=None,
+    continuation_token=None,
+):
+    """Iterate over the raw `list_objects_v2` responses for a prefix.
+
+    Each page is requested only when the previous one has been consumed,
+    following the continuation token returned by S3, so arbitrarily large
+    prefixes can be listed without holding more than one page in memory.
+
+    Args:
+        client: The boto3 S3 client used to make the requests.
+        bucket_name (str): Name of the S3 bucket.
+        prefix (:object: str, optional): Only list keys under this prefix.
+        delimiter (:object: str, optional): Group keys into common prefixes
+            using this delimiter. When `None`, every key under the prefix
+            is listed.
+        page_size (:object: int, optional): Maximum number of keys returned
+            in each page. Defaults to the S3 default of 1000.
+        start_after (:object: str, optional): Only list keys after this key.
+        continuation_token (:object: str, optional): Resume listing from a
+            token returned by a previous page.
+
+    Yields:
+        dict
+    """
+    params = {"Bucket": bucket_name, "Prefix": prefix}
+
+    if delimiter:
+        params["Delimiter"] = delimiter
+
+    if page_size:
+        params["MaxKeys"] = page_size
+
+    if start_after:
+        params["StartAfter"] = start_after
+
+    while True:
+        if continuation_token:
+            params["ContinuationToken"] = continuation_token
+
+        page = client.list_objects_v2(**params)
+        yield page
+
+        continuation_token = page.get("NextContinuationToken")
+
+        if not (page.get("IsTruncated") and continuation_token):
+            break
+
+
+def build_index(pages, prefix="", delimiter="/"):
+    """Build the hierarchy of a prefix from a flat listing of its keys.
+
+    Every directory under the prefix, including the prefix itself, is
+    mapped to a page shaped like a `list_objects_v2` response made with the
+    delimiter, so it can be used in place of listing that directory.
+
+    Args:
+        pages: Iterable of `list_objects_v2` responses made without a
+            delimiter.
+        prefix (:object: str, optional): The prefix that was listed.
+        delimiter (:object: str, optional): The delimiter that separates
+            directories in a key. Defaults to `/`.
+
+    Returns:
+        dict
+    """
+
+    def get_page(path):
+        if path not in index:
+            index[path] = {"CommonPrefixes": [], "Contents": [], "KeyCount": 0}
+        return index[path]
+
+    index = {}
+    get_page(prefix)
+
+    for page in pages:
+        for obj in page.get("Contents", []):
+            parts = obj["Key"][len(prefix) :].split(delimiter)
+            path = prefix
+
+            # register every directory between the prefix and the key
+            for part in parts[:-1]:
+                child = path + part + delimiter
+
+                if child not in index:
+                    parent = get_page(path)
+                    parent["CommonPrefixes"].append({"Prefix": child})
+                    parent["KeyCount"] += 1
+                    get_page(child)
+
+                path = child
+
+            parent = get_page(path)
+            parent["Contents"].append(obj)
+            parent["KeyCount"] += 1
+
+    return index
+
+
+def split_page(page, page_size=None):
+    """Split a page holding all the entries of a directory, like the pages
+    of `build_index()`, into pages of at most `page_size` entries in key
+    order, like S3 lists that directory with a delimiter.
+
+    Args:
+        page (dict): The page of the directory.
+        page_size (:object: int, optional): Maximum number of entries in
+            every page. Defaults to the S3 default of 1000.
+
+    Yields:
+        dict
+    """
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    entries = sorted(
+        page.get("CommonPrefixes", []) + page.get("Contents", []),
+        key=lambda entry: entry.get("Prefix", entry.get("Key")),
+    )
+
+    if not entries:
+        yield page
+        return
+
+    for start in range(0, len(entries), page_size):
+        chunk = entries[start : start + page_size]
+        yield {
+            "CommonPrefixes": [entry for entry in chunk if "Prefix" in entry],
+            "Contents": [entry for entry in chunk if "Key" in entry],
+            "KeyCount": len(chunk),
+        }
+
+
+def _midpoint(low, high):
+    """Returns a string roughly halfway between two strings, in the order
+    in which S3 lists keys."""
+    size = max(len(low), len(high)) + 1
+    base = _MAX_CHAR - _MIN_CHAR + 1
+
+    def to_int(string):
+        digits = [min(max(ord(c), _MIN_CHAR), _MAX_CHAR) for c in string]
+        digits += [_MIN_CHAR] * (size - len(digits))
+        value = 0
+
+        for digit in digits:
+            value = value * base + digit - _MIN_CHAR
+
+        return value
+
+    value = (to_int(low) + to_int(high)) // 2
+    chars = []
+
+    for _ in range(size):
+        value, digit = divmod(value, base)
+        chars.append(chr(digit + _MIN_CHAR))
+
+    return "".join(reversed(chars)).rstrip(chr(_MIN_CHAR))
+
+
+def sample_boundaries(client, bucket_name, shards, prefix="", max_workers=8):
+    """Find keys which split the keys under a prefix into ranges, to list
+    them in concurrent shards.
+
+    The key space is bisected: for every range, the first key after its
+    midpoint is looked up with a single-key listing, and becomes a new
+    boundary. The ranges are split evenly in the key space, regardless of
+    how many keys they hold, so boundaries given by hand may be better for
+    skewed key spaces.
+
+    Args:
+        client: The boto3 S3 client used to make the requests.
+        bucket_name (str): Name of the S3 bucket.
+        shards (int): The number of ranges wanted.
+        prefix (:object: str, optional): The prefix of the keys.
+        max_workers (:object: int, optional): Maximum number of requests in
+            flight at once. Defaults to 8.
+
+    Returns:
+        A sorted list of at most `shards - 1` keys.
+    """
+
+    def first_key_after(key):
+        page = client.list_objects_v2(
+            Bucket=bucket_name, Prefix=prefix, StartAfter=key, MaxKeys=1
+        )
+        contents = page.get("Contents", [])
+        return contents[0]["Key"] if contents else None
+
+    boundaries = []
+    ranges = [(prefix, prefix + chr(_MAX_CHAR))]
+    max_probes = shards * 4
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while ranges and len(boundaries) < shards - 1 and max_probes > 0:
+            midpoints = [_midpoint(low, high) for low, high in ranges]
+            keys = list(executor.map(first_key_after, midpoints))
+            max_probes -= len(ranges)
+            next_ranges = []
+
+            for (low, high), midpoint, key in zip(ranges, midpoints, keys):
+                if key is not None and key < high:
+                    boundaries.append(key)
+                    next_ranges.extend([(low, key), (key, high)])
+
+                # there are no keys between the midpoint and the end
+                elif low < midpoint:
+                    next_ranges.append((low, midpoint))
+
+            ranges = next_ranges
+
+    boundaries = sorted(set(boundaries))
+
+    # keep evenly spaced boundaries if too many were found
+    if len(boundaries) >= shards:
+        step = float(len(boundaries) + 1) / shards
+        boundaries = [boundaries[int(step * i) - 1] for i in range(1, shards)]
+
+    return boundaries
+
+
+def _trim_page(page, upper):
+    """Drop the entries of a page after `upper`. Returns the page, and
+    whether entries were dropped."""
+    prefixes = [p for p in page.get("CommonPrefixes", []) if p["Prefix"] <= upper]
+    contents = [c for c in page.get("Contents", []) if c["Key"] <= upper]
+    trimmed = len(prefixes) + len(contents) < page.get("KeyCount", 0)
+
+    page = dict(page, CommonPrefixes=prefixes, Contents=contents)
+    page["KeyCount"] = len(prefixes) + len(contents)
+    return page, trimmed
+
+
+def iter_sharded_pages(
+    client,
+    bucket_name,
+    boundaries,
+    prefix="",
+    delimiter=None,
+    page_size=None,
+    max_workers=8,
+):
+    """Iterate over the pages listing a prefix, listing ranges of its keys
+    concurrently.
+
+    The ranges are separated by `boundaries`: the first range holds the keys
+    up to the first boundary, included, the next one the keys after it and
+    up to the second boundary, and so on. All the ranges are listed at once,
+    and their pages are yielded in key order, as if the prefix was listed
+    with `iter_pages`. Every range is listed at most a couple of pages
+    ahead of the pages being yielded, so listing a prefix takes bounded
+    memory however large it is.
+
+    Args:
+        client: The boto3 S3 client used to make the requests.
+        bucket_name (str): Name of the S3 bucket.
+        boundaries (list): Keys separating the ranges, see
+            `sample_boundaries()`.
+        prefix (:object: str, optional): Only list keys under this prefix.
+        delimiter (:object: str, optional): Group keys into common prefixes
+            using this delimiter.
+        page_size (:object: int, optional): Maximum number of keys returned
+            in each page.
+        max_workers (:object: int, optional): Maximum number of ranges
+            listed at once. Defaults to 8.
+
+    Yields:
+        dict
+    """
+
+    stopped = Event()
+
+    def put(pages, item):
+        # give up when the pages are not consumed anymore
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def list_range(lower, upper, pages):
+        if stopped.is_set():
+            return
+
+        try:
+            for page in iter_pages(
+                client,
+                bucket_name,
+                prefix=prefix,
+                delimiter=delimiter,
+                page_size=page_size,
+                start_after=lower,
+            ):
+                trimmed = False
+
+                if upper is not None:
+                    page, trimmed = _trim_page(page, upper)
+
+                if not put(pages, page) or trimmed:
+                    break
+        except Exception:
+            put(pages, sys.exc_info())
+        else:
+            put(pages, _DONE)
+
+    def iter_range(pages):
+        while True:
+            item = pages.get()
+
+            if item is _DONE:
+                return
+
+            if isinstance(item, tuple):
+                reraise(*item)
+
+            yield item
+
+    bounds = [None] + sorted(boundaries) + [None]
+    queues = [queue.Queue(maxsize=_PAGES_AHEAD) for _ in bounds[1:]]
+    last_prefix = None
+    empty = True
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for lower, upper, pages in zip(bounds, bounds[1:], queues):
+            executor.submit(list_range, lower, upper, pages)
+
+        try:
+            for page in (page for pages in queues for page in iter_range(pages)):
+                # a common prefix holding a boundary is listed by both of
+                # the ranges around it
+                prefixes = page.get("CommonPrefixes", [])
+
+                if prefixes and prefixes[0]["Prefix"] == last_prefix:
+                    page = dict(page, CommonPrefixes=prefixes[1:])
+                    page["KeyCount"] = page.get("KeyCount", 0) - 1
+
+                if page.get("CommonPrefixes"):
+                    last_prefix = page["CommonPrefixes"][-1]["Prefix"]
+
+                # empty ranges are skipped, unless the whole prefix is empty
+                if page.get("KeyCount"):
+                    empty = False
+                    yield dict(page, IsTruncated=False, NextContinuationToken=None)
+        finally:
+            # stop the ranges still being listed when the pages are not all
+            # consumed
+            stopped.set()
+
+    if empty:
+        yield {"CommonPrefixes": [], "Contents": [], "KeyCount": 0}
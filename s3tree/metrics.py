@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Metrics of the requests made to S3 and of the caches."""
+import time
+from functools import wraps
+from json import dumps
+from threading import Lock
+
+from .utils import clock
+
+# upper bounds of the buckets of the latency histograms, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _response_size(response):
+    """Returns the number of bytes in the body of a response."""
+    headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+
+    try:
+        return int(headers.get("content-length", 0))
+    except ValueError:
+        return 0
+
+
+class OperationMetrics(object):
+    """
+    Metrics of the requests made for one S3 operation, like `ListObjectsV2`.
+
+    `histogram` counts the requests by latency: its n-th item is the number
+    of requests which took at most `LATENCY_BUCKETS[n]` seconds and more than
+    the previous bound, and its last item the number of slower requests.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    @property
+    def mean_time(self):
+        """Mean latency of the requests, in seconds."""
+        return self.total_time / self.count if self.count else 0.0
+
+    def add(self, duration, size, error):
+        self.count += 1
+        self.errors += error is not None
+        self.bytes += size
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    @property
+    def as_dict(self):
+        """Dictionary representation of these metrics."""
+        properties = (
+            "count",
+            "errors",
+            "bytes",
+            "total_time",
+            "mean_time",
+            "max_time",
+            "histogram",
+        )
+        return {p: getattr(self, p) for p in properties}
+
+
+class Metrics(object):
+    """
+    Counts, latencies and sizes of the requests made to S3, by operation,
+    and hits and misses of the caches.
+
+    A `Metrics` object can be given to a single tree, to measure what it and
+    its child trees and files do, or set globally to measure every tree.
+    Listeners are called after every request, with the name of the
+    operation, its parameters, its duration in seconds, the size of its
+    response in bytes, and the exception it raised, if any. Listeners must
+    be thread safe, since requests are made from many threads.
+
+    Usage:
+        >>> s3tree.config.metrics = Metrics()
+        >>> tree = S3Tree(bucket_name='demo', listing='flat')
+        >>> s3tree.config.metrics.operations['ListObjectsV2'].count
+        1
+
+    Args:
+        listeners (:object: list, optional): Callables called after every
+            request.
+    """
+
+    def __init__(self, listeners=None):
+        self.listeners = list(listeners or [])
+        self.operations = {}
+        self.cache_hits = {}
+        self.cache_misses = {}
+
+        self._lock = Lock()
+
+    def add_listener(self, listener):
+        """Call `listener` after every request."""
+        self.listeners.append(listener)
+
+    def record_call(self, operation, params, start, duration, size, error=None):
+        """Record a request. `start` is the time at which it was made, as a
+        timestamp."""
+        with self._lock:
+            if operation not in self.operations:
+                self.operations[operation] = OperationMetrics()
+            self.operations[operation].add(duration, size, error)
+
+        for listener in self.listeners:
+            listener(operation, params, start, duration, size, error)
+
+    def record_cache(self, name, hit):
+        """Record a lookup in the cache called `name`."""
+        counters = self.cache_hits if hit else self.cache_misses
+
+        with self._lock:
+            counters[name] = counters.get(name, 0) + 1
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.operations = {}
+            self.cache_hits = {}
+            self.cache_misses = {}
+
+    def wrap(self, client):
+        """Returns a proxy to a boto3 client, whose requests are recorded in
+        these metrics."""
+        return MeteredClient(client, self)
+
+    @property
+    def as_dict(self):
+        """Dictionary representation of these metrics."""
+        with self._lock:
+            return {
+                "operations": {
+                    name: operation.as_dict
+                    for name, operation in self.operations.items()
+                },
+                "cache_hits": dict(self.cache_hits),
+                "cache_misses": dict(self.cache_misses),
+            }
+
+    @property
+    def as_json(self):
+        """JSON representation of these metrics."""
+        return dumps(self.as_dict)
+
+
+class MeteredClient(object):
+    """Proxy to a boto3 client, which records its requests in `Metrics`.
+    Everything else is forwarded to the client."""
+
+    def __init__(self, client, metrics):
+        self._client = client
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        operation = self._client.meta.method_to_api_mapping.get(name)
+
+        if operation is None:
+            return attr
+
+        @wraps(attr)
+        def call(*args, **kwargs):
+            start = time.time()
+            started = clock()
+
+            try:
+                response = attr(*args, **kwargs)
+            except Exception as exc:
+                self._metrics.record_call(
+                    operation, kwargs, start, clock() - started, 0, exc
+                )
+                raise
+
+            self._metrics.record_call(
+                operation, kwargs, start, clock() - started, _response_size(response)
+            )
+            return response
+
+        return call
+
+
+class SpanListener(object):
+    """
+    Metrics listener which reports every request as a span of an
+    OpenTelemetry tracer, or of any tracer with the same interface.
+
+    Usage:
+        >>> from opentelemetry import trace
+        >>> tracer = trace.get_tracer('s3tree')
+        >>> s3tree.config.metrics = Metrics(listeners=[SpanListener(tracer)])
+
+    Args:
+        tracer: The tracer which creates the spans.
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def __call__(self, operation, params, start, duration, size, error):
+        start_ns = int(start * 1e9)
+        span = self.tracer.start_span("S3." + operation, start_time=start_ns)
+        span.set_attribute("rpc.system", "aws-api")
+        span.set_attribute("rpc.service", "S3")
+        span.set_attribute("rpc.method", operation)
+        span.set_attribute("http.response_content_length", size)
+
+        for param, attribute in (
+            ("Bucket", "aws.s3.bucket"),
+            ("Key", "aws.s3.key"),
+            ("Prefix", "aws.s3.prefix"),
+        ):
+            if param in params:
+                span.set_attribute(attribute, params[param])
+
+        if error is not None:
+            span.record_exception(error)
+
+        span.end(end_time=start_ns + int(duration * 1e9))
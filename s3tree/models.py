@@ -3,13 +3,47 @@
 """This module contains the model objects that are used to represent
 trees and files in S3Tree."""
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from hashlib import md5
 from json import dumps
 
 import mimelib
+from botocore.exceptions import ClientError
 from future.utils import python_2_unicode_compatible
+from six import string_types
 
-from .exceptions import FileNotFound
-from .utils import cached_property, humanize_file_size
+from .exceptions import DownloadVerificationError, FileNotFound
+from .utils import humanize_file_size
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+# a single copy of every storage class, shared by all the files
+_storage_classes = {}
+
+# file types detected so far, by extension or content type
+_file_types = {}
+
+
+def _extension(path):
+    """Returns the last two extensions of a path, which is all that is used
+    to guess its MIME type (like `.tar.gz`)."""
+    root, ext = os.path.splitext(os.path.basename(path))
+    return os.path.splitext(root)[1] + ext
+
+
+def _detect_file_type(path, content_type=None):
+    if content_type:
+        key = ("mimetype", content_type)
+    else:
+        key = ("url", _extension(path))
+
+    if key not in _file_types:
+        data = content_type or "file" + key[1]
+        _file_types[key] = mimelib.Mime(key[0], data).file_type
+
+    return _file_types[key]
 
 
 @python_2_unicode_compatible
@@ -18,6 +52,8 @@ class Directory(object):
     Iterable container that represents a directory.
     """
 
+    __slots__ = ("path", "s3tree")
+
     def __init__(self, data, s3tree):
         self.path = data.get("Prefix")
         self.s3tree = s3tree
@@ -30,19 +66,16 @@ class Directory(object):
         return self.name
 
     def get_tree(self):
-        return self.s3tree.__class__(
-            bucket_name=self.s3tree.bucket_name,
-            path=self.path,
-            aws_access_key_id=self.s3tree._access_key,
-            aws_secret_access_key=self.s3tree._secret_key,
-        )
+        """Returns the tree under this directory. The tree shares the S3
+        client of the tree this directory belongs to."""
+        return self.s3tree._subtree(self.path)
 
-    @cached_property
+    @property
     def as_dict(self):
         """Dictionary representation of this directory."""
         return {"name": self.name, "path": self.path}
 
-    @cached_property
+    @property
     def as_json(self):
         """JSON representation of this directory."""
         return dumps(self.as_dict)
@@ -50,7 +83,22 @@ class Directory(object):
 
 @python_2_unicode_compatible
 class File(object):
-    """Object that represents an individual file."""
+    """Object that represents an individual file.
+
+    Files use slots rather than a `__dict__`, so that listings of millions
+    of files stay small in memory.
+    """
+
+    __slots__ = (
+        "path",
+        "etag",
+        "last_modified",
+        "size_in_bytes",
+        "storage_class",
+        "content_type",
+        "metadata",
+        "__s3tree",
+    )
 
     def __init__(self, data, s3tree):
         # public attributes
@@ -58,10 +106,14 @@ class File(object):
         self.etag = data.get("ETag")
         self.last_modified = data.get("LastModified")
         self.size_in_bytes = data.get("Size")
-        self.storage_class = data.get("StorageClass")
 
-        # create a mime object for this file
-        self.mime = mimelib.url(self.path)
+        storage_class = data.get("StorageClass")
+        self.storage_class = _storage_classes.setdefault(storage_class, storage_class)
+
+        # the actual content type and the user metadata are only known after
+        # fetching the metadata of this file
+        self.content_type = None
+        self.metadata = None
 
         # private attributes
         self.__s3tree = s3tree
@@ -76,28 +128,262 @@ class File(object):
         """File name of this file."""
         return os.path.basename(self.path)
 
+    @property
+    def mime(self):
+        """A mime object for this file."""
+        if self.content_type:
+            return mimelib.mimetype(self.content_type)
+        return mimelib.url(self.path)
+
     @property
     def file_type(self):
-        """Returns this file's type."""
-        return self.mime.file_type
+        """Returns this file's type. It is guessed from the extension of the
+        file, unless its content type is known."""
+        return _detect_file_type(self.path, self.content_type)
+
+    def __get_object(self, **kwargs):
+        client = self.__s3tree.client
 
-    def read(self):
-        """Read the contents of this file. This method returns a string."""
         try:
-            return (
-                self.__s3tree.client.get_object(
-                    Bucket=self.__s3tree.bucket_name, Key=self.path
-                )["Body"]
-                .read()
-                .decode("utf-8")
+            return client.get_object(
+                Bucket=self.__s3tree.bucket_name, Key=self.path, **kwargs
             )
-        except self.__s3tree.client.exceptions.NoSuchKey:
+        except client.exceptions.NoSuchKey:
             raise FileNotFound(self.path)
 
+    def open(self):
+        """Open this file for reading. This method returns a file-like object
+        which streams the contents of this file as they are read, and should
+        be closed once done with."""
+        return self.__get_object()["Body"]
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Iterate over the contents of this file in chunks of bytes, so that
+        only one chunk is held in memory at a time.
+
+        Args:
+            chunk_size (:object: int, optional): Size of each chunk, in
+                bytes. Defaults to 1 MB.
+        """
+        body = self.open()
+
+        try:
+            for chunk in iter(lambda: body.read(chunk_size), b""):
+                yield chunk
+        finally:
+            body.close()
+
+    def read_range(self, start, end=None):
+        """Read the bytes of this file from `start` up to, but not including,
+        `end`, using an HTTP range request.
+
+        Usage:
+            >>> header = myfile.read_range(0, 512)  # the first 512 bytes
+            >>> rest = myfile.read_range(512)  # from byte 512 to the end
+            >>> tail = myfile.read_range(-1024)  # the last 1024 bytes
+
+        Args:
+            start (int): Offset of the first byte to read. If negative, the
+                last `-start` bytes of the file are read.
+            end (:object: int, optional): Offset after the last byte to read.
+                Defaults to the end of the file.
+
+        Returns:
+            bytes
+        """
+        if start < 0:
+            byte_range = "bytes={}".format(start)
+        elif end is None:
+            byte_range = "bytes={}-".format(start)
+        elif end > start:
+            byte_range = "bytes={}-{}".format(start, end - 1)
+        else:
+            return b""
+
+        try:
+            return self.__get_object(Range=byte_range)["Body"].read()
+        except ClientError as exc:
+            # like slicing, reading past the end of the file returns nothing
+            if exc.response["Error"]["Code"] == "InvalidRange":
+                return b""
+            raise
+
+    def read_bytes(self, encoding=None):
+        """Read the contents of this file. This method returns bytes, or a
+        string decoded with `encoding` if one is given.
+
+        If the tree has a body cache, the contents are served from it while
+        they are fresh, and revalidated with a conditional request once they
+        are stale."""
+        cache = self.__s3tree.body_cache
+
+        if cache is None:
+            data = self.__get_object()["Body"].read()
+        else:
+            data = self.__read_cached(cache)
+
+        return data.decode(encoding) if encoding else data
+
+    def __read_cached(self, cache):
+        # cached contents are served without any request, so only to trees
+        # using the credentials they were read with
+        key = (
+            self.__s3tree._access_key,
+            self.__s3tree.endpoint_url,
+            self.__s3tree.bucket_name,
+            self.path,
+        )
+        cached, fresh = cache.lookup(key)
+
+        # only use fresh contents which are at least as recent as this listing
+        if fresh and cached[0] == self.etag:
+            self.__record_cache(cache, True)
+            return cached[1]
+
+        params = {}
+
+        if cached is not None:
+            params["IfNoneMatch"] = cached[0]
+
+        try:
+            response = self.__get_object(**params)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] not in ("304", "NotModified"):
+                raise
+
+            # the file has not changed, the cached contents are fresh again
+            cache.set(key, cached)
+            self.__record_cache(cache, True)
+            return cached[1]
+
+        self.__record_cache(cache, False)
+        data = response["Body"].read()
+        cache.set(key, (response.get("ETag"), data))
+        return data
+
+    def __record_cache(self, cache, hit):
+        """Count a lookup in the body cache, in the cache and in the metrics
+        of the tree."""
+        cache.record(hit)
+
+        if self.__s3tree.metrics is not None:
+            self.__s3tree.metrics.record_cache("body", hit)
+
+    def read(self):
+        """Read the contents of this file. This method returns a string."""
+        return self.read_bytes(encoding="utf-8")
+
+    def download(self, dest, part_size=DEFAULT_PART_SIZE, max_workers=8, verify=False):
+        """Download this file by fetching ranges of it concurrently.
+
+        Every range is requested only if the object still has the ETag it
+        had when it was listed, so that parts of different versions of the
+        object are never mixed.
+
+        Usage:
+            >>> myfile.download('/tmp/dump.log', max_workers=16)
+            >>> buf = myfile.download(bytearray(myfile.size_in_bytes))
+
+        Args:
+            dest: Path of the file to write to, or a writable buffer like a
+                `bytearray`, `mmap` or `memoryview`, at least as large as
+                this file, into which the parts are written in place.
+            part_size (:object: int, optional): Size of the ranges, in bytes.
+                Defaults to 8 MB.
+            max_workers (:object: int, optional): Maximum number of ranges
+                downloaded at once. Defaults to 8.
+            verify (:object: bool, optional): If `True`, check the MD5 of the
+                downloaded contents against the ETag of this file, unless it
+                was uploaded in multiple parts. Objects encrypted with KMS
+                don't have an MD5 ETag, and should not be verified. Defaults
+                to `False`.
+
+        Returns:
+            `dest`
+        """
+        size = self.size_in_bytes
+        ranges = [
+            (start, min(start + part_size, size)) for start in range(0, size, part_size)
+        ]
+
+        if isinstance(dest, string_types):
+            # preallocate the file, so that parts can be written in any order
+            with open(dest, "wb") as fp:
+                fp.truncate(size)
+
+            write_part = partial(self.__write_part_to_file, dest)
+        else:
+            view = memoryview(dest)
+
+            if len(view) < size:
+                raise ValueError("Buffer is smaller than the file: {}".format(size))
+
+            write_part = partial(self.__write_part_to_buffer, view)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(lambda r: write_part(*r), ranges):
+                pass
+
+        if verify:
+            self.__verify(dest)
+
+        return dest
+
+    def __iter_part(self, start, end):
+        params = {"Range": "bytes={}-{}".format(start, end - 1)}
+
+        if self.etag:
+            params["IfMatch"] = self.etag
+
+        try:
+            body = self.__get_object(**params)["Body"]
+        except ClientError as exc:
+            # the object has changed since it was listed
+            if exc.response["Error"]["Code"] in ("PreconditionFailed", "412"):
+                raise DownloadVerificationError(self.path)
+            raise
+
+        try:
+            for chunk in iter(lambda: body.read(DEFAULT_CHUNK_SIZE), b""):
+                yield chunk
+        finally:
+            body.close()
+
+    def __write_part_to_file(self, dest, start, end):
+        with open(dest, "r+b") as fp:
+            fp.seek(start)
+
+            for chunk in self.__iter_part(start, end):
+                fp.write(chunk)
+
+    def __write_part_to_buffer(self, view, start, end):
+        for chunk in self.__iter_part(start, end):
+            view[start : start + len(chunk)] = chunk
+            start += len(chunk)
+
+    def __verify(self, dest):
+        etag = (self.etag or "").strip('"')
+
+        # the ETag of files uploaded in multiple parts is not their MD5
+        if not etag or "-" in etag:
+            return
+
+        digest = md5()
+
+        if isinstance(dest, string_types):
+            with open(dest, "rb") as fp:
+                for chunk in iter(lambda: fp.read(DEFAULT_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(memoryview(dest)[: self.size_in_bytes])
+
+        if digest.hexdigest() != etag:
+            raise DownloadVerificationError(self.path)
+
     def __str__(self):
         return self.name
 
-    @cached_property
+    @property
     def as_dict(self):
         """Dictionary representation of this file."""
         properties = ("name", "path", "etag", "size", "file_type", "size_in_bytes")
@@ -105,7 +391,7 @@ class File(object):
         data["last_modified"] = self.last_modified.isoformat()
         return data
 
-    @cached_property
+    @property
     def as_json(self):
         """JSON representation of this file."""
         return dumps(self.as_dict)
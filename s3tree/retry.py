@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Retries with backoff, and rate limiting of the requests made to S3."""
+import random
+import time
+from functools import wraps
+from threading import Lock
+
+from botocore.exceptions import (ClientError, ConnectionClosedError,
+                                 EndpointConnectionError, ReadTimeoutError)
+
+from .utils import clock
+
+# error codes returned by S3 when requests are made too fast
+THROTTLING_ERRORS = (
+    "SlowDown",
+    "503",
+    "ServiceUnavailable",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TooManyRequests",
+    "429",
+)
+
+# error codes of transient failures, which are worth retrying
+TRANSIENT_ERRORS = THROTTLING_ERRORS + (
+    "500",
+    "InternalError",
+    "RequestTimeout",
+)
+
+CONNECTION_ERRORS = (ConnectionClosedError, EndpointConnectionError, ReadTimeoutError)
+
+
+def error_code(exc):
+    """Returns the error code of a `ClientError`, as a string."""
+    return str(exc.response.get("Error", {}).get("Code"))
+
+
+class TokenBucket(object):
+    """
+    Rate limiter shared by all the threads making requests.
+
+    Every request takes a token from the bucket, which is refilled at `rate`
+    tokens per second, and holds at most `burst` tokens. Requests wait for a
+    token when the bucket is empty. The rate adapts to S3: it is halved
+    every time a request is throttled, down to `min_rate`, and grows back
+    slowly with every successful request, up to `max_rate`.
+
+    Args:
+        max_rate (float): Maximum number of requests per second.
+        burst (:object: int, optional): Maximum number of requests made at
+            once after the bucket has been idle. Defaults to `max_rate`.
+        min_rate (:object: float, optional): Minimum number of requests per
+            second, however often requests are throttled. Defaults to 1.
+    """
+
+    def __init__(self, max_rate, burst=None, min_rate=1):
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min(min_rate, max_rate))
+        self.burst = burst or max(1, int(max_rate))
+        self.rate = self.max_rate
+
+        self._lock = Lock()
+        self._tokens = float(self.burst)
+        self._updated = clock()
+
+    def __refill(self):
+        now = clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Take a token from the bucket, waiting until there is one."""
+        while True:
+            with self._lock:
+                self.__refill()
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def throttled(self):
+        """Slow down after a request was throttled."""
+        with self._lock:
+            self.__refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        """Speed up again after a successful request."""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.__refill()
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+
+class RetryPolicy(object):
+    """
+    Policy for retrying the requests made to S3 which fail with a transient
+    error, like `SlowDown` or `503 Service Unavailable`.
+
+    Failed requests are retried after an exponential backoff with full
+    jitter: the n-th retry waits a random time between 0 and
+    `base_delay * 2 ** n` seconds, capped to `max_delay`. The policy applies
+    on top of the retries made by botocore.
+
+    The policy and its rate limiter can be shared by every tree and thread,
+    so that parallel listings and reads back off together.
+
+    Usage:
+        >>> s3tree.config.retry_policy = RetryPolicy(
+        ...     max_attempts=8, rate_limiter=TokenBucket(max_rate=500)
+        ... )
+
+    Args:
+        max_attempts (:object: int, optional): Maximum number of attempts
+            for every request, including the first one. Defaults to 5.
+        base_delay (:object: float, optional): Base of the backoff, in
+            seconds. Defaults to 0.1.
+        max_delay (:object: float, optional): Maximum backoff, in seconds.
+            Defaults to 20.
+        rate_limiter (:object: TokenBucket, optional): Rate limiter that
+            every request waits for.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=0.1, max_delay=20, rate_limiter=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limiter = rate_limiter
+
+        # number of requests retried, for monitoring
+        self.retries = 0
+
+    def backoff(self, attempt):
+        """Returns the number of seconds to wait before retrying a request
+        which failed `attempt` times."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, func, *args, **kwargs):
+        """Call `func`, retrying it when it fails with a transient error."""
+        attempt = 0
+
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            try:
+                result = func(*args, **kwargs)
+            except ClientError as exc:
+                code = error_code(exc)
+
+                if code in THROTTLING_ERRORS and self.rate_limiter is not None:
+                    self.rate_limiter.throttled()
+
+                if code not in TRANSIENT_ERRORS:
+                    raise
+
+                error = exc
+            except CONNECTION_ERRORS as exc:
+                error = exc
+            else:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.succeeded()
+
+                return result
+
+            attempt += 1
+
+            if attempt >= self.max_attempts:
+                raise error
+
+            self.retries += 1
+            time.sleep(self.backoff(attempt))
+
+    def wrap(self, client):
+        """Returns a proxy to a boto3 client, whose requests follow this
+        policy."""
+        return RetryingClient(client, self)
+
+
+class RetryingClient(object):
+    """Proxy to a boto3 client, which makes its requests through a
+    `RetryPolicy`. Everything else is forwarded to the client."""
+
+    def __init__(self, client, policy):
+        self._client = client
+        self._policy = policy
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+
+        if name not in self._client.meta.method_to_api_mapping:
+            return attr
+
+        @wraps(attr)
+        def call(*args, **kwargs):
+            return self._policy.call(attr, *args, **kwargs)
+
+        return call
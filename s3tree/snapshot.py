@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Snapshots of trees, used to find what changed between two listings."""
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from dateutil.tz import tzutc
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+TreeDiff = namedtuple("TreeDiff", ["added", "removed", "modified", "snapshot"])
+TreeDiff.__doc__ = """Changes in a tree since a previous snapshot.
+
+`added` and `modified` are lists of `File` objects, `removed` is a list of
+keys, and `snapshot` is the snapshot of the tree after the changes, to diff
+against next time.
+"""
+
+
+def _entry(obj):
+    return (obj.etag, obj.size_in_bytes, obj.last_modified.isoformat())
+
+
+class Snapshot(object):
+    """
+    The key, ETag, size and modification time of every file under a path
+    at some point in time.
+
+    Usage:
+        >>> snapshot = tree.snapshot()
+        >>> with open('snapshot.json', 'w') as fp:
+        ...     snapshot.save(fp)
+        >>> with open('snapshot.json') as fp:
+        ...     changes = tree.diff(Snapshot.load(fp))
+
+    Args:
+        bucket_name (str): Name of the S3 bucket.
+        path (str): The normalized path of the tree.
+        entries (dict): `(etag, size, last_modified)` tuples by key, where
+            `last_modified` is an ISO 8601 string.
+        taken_at (:object: str, optional): When the snapshot was taken, as
+            an ISO 8601 string. Defaults to now.
+    """
+
+    def __init__(self, bucket_name, path, entries, taken_at=None):
+        self.bucket_name = bucket_name
+        self.path = path
+        self.entries = entries
+        self.taken_at = taken_at or datetime.now(tzutc()).isoformat()
+
+    @classmethod
+    def from_files(cls, bucket_name, path, files):
+        """Take a snapshot of an iterable of `File` objects."""
+        return cls(bucket_name, path, {f.path: _entry(f) for f in files})
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def last_key(self):
+        """The last key in this snapshot, in the order in which S3 lists
+        keys."""
+        return max(self.entries) if self.entries else None
+
+    def diff(self, files, new_keys_only=False):
+        """Compare the files of a listing to this snapshot.
+
+        Args:
+            files (iterable): `File` objects listed under the same path.
+            new_keys_only (:object: bool, optional): If `True`, `files` only
+                holds the files listed after `last_key`, and files which
+                are not in it are not considered removed.
+
+        Returns:
+            TreeDiff
+        """
+        added = []
+        modified = []
+        entries = dict(self.entries) if new_keys_only else {}
+
+        for file_obj in files:
+            entry = _entry(file_obj)
+            previous = self.entries.get(file_obj.path)
+
+            if previous is None:
+                added.append(file_obj)
+
+            # a file uploaded again with the same contents is not modified
+            elif previous[:2] != entry[:2]:
+                modified.append(file_obj)
+
+            entries[file_obj.path] = entry
+
+        removed = sorted(set(self.entries) - set(entries))
+        snapshot = Snapshot(self.bucket_name, self.path, entries)
+
+        return TreeDiff(added, removed, modified, snapshot)
+
+    def save(self, fp):
+        """Write this snapshot to a file object, as JSON."""
+        json.dump(
+            {
+                "version": SNAPSHOT_FORMAT_VERSION,
+                "bucket_name": self.bucket_name,
+                "path": self.path,
+                "taken_at": self.taken_at,
+                "entries": [[key] + list(v) for key, v in sorted(self.entries.items())],
+            },
+            fp,
+        )
+
+    @classmethod
+    def load(cls, fp):
+        """Read a snapshot written with `save()` from a file object."""
+        data = json.load(fp)
+        entries = {e[0]: tuple(e[1:]) for e in data["entries"]}
+        return cls(data["bucket_name"], data["path"], entries, data["taken_at"])
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Aggregate statistics of the files in a tree."""
+import os
+from json import dumps
+
+from .utils import humanize_file_size
+
+
+def _add(totals, key, size):
+    if key not in totals:
+        totals[key] = {"files": 0, "bytes": 0}
+
+    totals[key]["files"] += 1
+    totals[key]["bytes"] += size
+
+
+class TreeStats(object):
+    """
+    Sizes and counts of the files in a tree, broken down by extension, by
+    storage class and by subdirectory.
+
+    Every breakdown maps a key to a `{"files": count, "bytes": size}` dict.
+    `by_directory` rolls up everything under each subdirectory of the tree,
+    at any depth, and `num_directories` counts the directories at any depth.
+
+    Files must be added in key order, as S3 lists them. Since all the keys
+    under a directory are then next to each other, a directory is counted
+    when a key first enters it, by comparing each key with the previous
+    one, and no path is kept in memory.
+
+    Args:
+        path (str): The normalized path of the tree.
+        delimiter (:object: str, optional): The delimiter that separates
+            directories in a key. Defaults to `/`.
+    """
+
+    def __init__(self, path, delimiter="/"):
+        self.path = path
+        self.delimiter = delimiter
+
+        self.total_bytes = 0
+        self.num_files = 0
+        self.by_extension = {}
+        self.by_storage_class = {}
+        self.by_directory = {}
+
+        self.num_directories = 0
+
+        # directories of the previous file, between the tree and the file
+        self._last_parts = []
+
+    @property
+    def size(self):
+        """Human readable size of all the files in the tree."""
+        return humanize_file_size(self.total_bytes)
+
+    def add_directory(self, path):
+        """Count a directory, given its full path. Each directory must only
+        be added once."""
+        self.num_directories += 1
+
+    def add_file(self, file_obj):
+        """Count a file of the tree."""
+        size = file_obj.size_in_bytes or 0
+        self.total_bytes += size
+        self.num_files += 1
+
+        extension = os.path.splitext(file_obj.name)[1].lower()
+        _add(self.by_extension, extension, size)
+        _add(self.by_storage_class, file_obj.storage_class, size)
+
+        # directories between the tree and the file
+        parts = file_obj.path[len(self.path) :].split(self.delimiter)[:-1]
+
+        if parts:
+            _add(self.by_directory, parts[0], size)
+
+        # the directories shared with the previous key were already counted
+        common = 0
+
+        for part, last_part in zip(parts, self._last_parts):
+            if part != last_part:
+                break
+            common += 1
+
+        self.num_directories += len(parts) - common
+        self._last_parts = parts
+
+    @property
+    def as_dict(self):
+        """Dictionary representation of these statistics."""
+        properties = (
+            "path",
+            "total_bytes",
+            "size",
+            "num_files",
+            "num_directories",
+            "by_extension",
+            "by_storage_class",
+            "by_directory",
+        )
+        return {p: getattr(self, p) for p in properties}
+
+    @property
+    def as_json(self):
+        """JSON representation of these statistics."""
+        return dumps(self.as_dict)
@@ -22,3 +22,23 @@ class S3TreeConfig(Singleton):
     def __init__(self):
         self.aws_access_key_id = None
         self.aws_secret_access_key = None
+        self.region_name = None
+        self.endpoint_url = None
+        # maximum number of connections kept open by each pooled S3 client
+        self.max_pool_connections = 10
+        # trees listed with `listing="auto"` are listed flat when they hold
+        # at most this many keys, including the keys of all subdirectories
+        self.flat_listing_threshold = 1000
+        # cache in which the listings of all the trees are stored
+        self.listing_cache = None
+        # cache in which the contents of the files read are stored
+        self.body_cache = None
+        # policy for retrying the requests which fail with transient errors,
+        # shared by all the trees
+        self.retry_policy = None
+        # metrics in which the requests of all the trees are recorded
+        self.metrics = None
+        # storage used by all the trees in place of S3
+        self.backend = None
+        # cache in which the metadata of the files fetched is stored
+        self.metadata_cache = None
@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """Utility functions for S3Tree."""
+import os
+import re
+import time
 from math import log
 
 from six import string_types
@@ -9,6 +12,12 @@ from .exceptions import InvalidPathError
 
 SUFFIXES = ["bytes", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB"]
 
+GLOB_WILDCARDS = "*?["
+
+# clock to measure durations with, since time.monotonic is not available on
+# Python 2
+clock = getattr(time, "monotonic", time.time)
+
 
 def normalize_path(path):
     """Take a path and return the normalized path which is usable in boto3.
@@ -62,23 +71,89 @@ def humanize_file_size(size):
     return "{:.4g} {}".format(float(size) / (1 << (order * 10)), SUFFIXES[order])
 
 
-class cached_property(object):
+def glob_literal_prefix(pattern):
+    """Returns the part of a glob pattern before its first wildcard.
+
+    >>> glob_literal_prefix("logs/2018-*.gz")
+    'logs/2018-'
+
     """
-    Descriptor (non-data) for building an attribute on-demand on first use.
+    for i, char in enumerate(pattern):
+        if char in GLOB_WILDCARDS:
+            return pattern[:i]
+
+    return pattern
+
+
+def _translate_glob_segment(segment, delimiter):
+    not_delimiter = "[^{}]".format(re.escape(delimiter))
+    parts = []
+    i = 0
+
+    while i < len(segment):
+        char = segment[i]
+        i += 1
+
+        if char == "*":
+            parts.append(not_delimiter + "*")
+        elif char == "?":
+            parts.append(not_delimiter)
+        elif char == "[" and "]" in segment[i + 1 :]:
+            end = segment.index("]", i + 1)
+            chars = segment[i:end].replace("\\", "\\\\")
+
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+
+            parts.append("[{}]".format(chars))
+            i = end + 1
+        else:
+            parts.append(re.escape(char))
+
+    return "".join(parts)
+
+
+def glob_to_regex(pattern, delimiter="/"):
+    """Translate a glob pattern into a compiled regular expression matching
+    whole keys.
+
+    `*` and `?` never match the delimiter, and `[...]` matches a set of
+    characters. A `**` segment matches any number of directories.
+
+    Args:
+        pattern (string)
+        delimiter (:object: string, optional): Defaults to `/`.
+
+    Returns:
+        A compiled regular expression.
     """
+    segments = pattern.split(delimiter)
+    parts = []
+
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
 
-    def __init__(self, factory):
-        """
-        <factory> is called such: factory(instance) to build the attribute.
-        """
-        self._attr_name = factory.__name__
-        self._factory = factory
+        if segment == "**":
+            parts.append(".*" if last else "(?:.*{})?".format(re.escape(delimiter)))
+            continue
 
-    def __get__(self, instance, owner):
-        # Build the attribute.
-        attr = self._factory(instance)
+        parts.append(_translate_glob_segment(segment, delimiter))
 
-        # Cache the value; hide ourselves.
-        setattr(instance, self._attr_name, attr)
+        if not last:
+            parts.append(re.escape(delimiter))
+
+    return re.compile("".join(parts) + r"\Z", re.DOTALL)
+
+
+def replace_file(source, dest):
+    """Rename `source` to `dest`, replacing `dest` if it exists.
+
+    Args:
+        source (str): Path of the file to rename.
+        dest (str): Path of the file to replace.
+    """
+    # os.rename doesn't replace existing files on Windows
+    if os.name == "nt" and os.path.exists(dest):
+        os.remove(dest)
 
-        return attr
+    os.rename(source, dest)
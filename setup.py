@@ -19,7 +19,7 @@ REQUIRES_PYTHON = ">=2.7.0"
 VERSION = None
 
 # What packages are required for this module to be executed?
-REQUIRED = ["boto3", "future", "mimelib", "six"]
+REQUIRED = ["boto3", "future", 'futures; python_version < "3"', "mimelib", "six"]
 
 # packages required for tests to run
 TEST_REQUIRED = ["pytest", "pytest-cov", "moto", "mock"]
@@ -103,7 +103,7 @@ setup(
     author_email=EMAIL,
     python_requires=REQUIRES_PYTHON,
     url=URL,
-    packages=find_packages(exclude=("tests",)),
+    packages=find_packages(exclude=("tests", "benchmarks")),
     install_requires=REQUIRED,
     tests_require=TEST_REQUIRED,
     include_package_data=True,
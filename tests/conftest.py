@@ -0,0 +1,4 @@
+import sys
+
+# the asyncio front end uses async generators
+collect_ignore = ["test_aio.py"] if sys.version_info < (3, 6) else []
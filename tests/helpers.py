@@ -11,17 +11,18 @@ DUMMY_ACCESS_KEY_ID = "dummy-key"
 DUMMY_SECRET_ACCESS_KEY = "dummy-secret"
 
 
-def generate_dummy_bucket():
-
-    session = Session(
-        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
-        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
-    )
-
-    s3 = session.resource("s3", region_name="us-east-1")
+def generate_dummy_bucket(client=None):
+    # the bucket is created in the mocked S3, unless another client, like a
+    # backend, is given
+    if client is None:
+        session = Session(
+            aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+            aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        )
+        client = session.client("s3", region_name="us-east-1")
 
     # create a bucket
-    s3.create_bucket(Bucket=DUMMY_BUCKET_NAME)
+    client.create_bucket(Bucket=DUMMY_BUCKET_NAME)
 
     # create some objects in this bucket
     # the root contain 7 objects: 4 files and 3 directories
@@ -45,4 +46,4 @@ def generate_dummy_bucket():
 
     for file in files:
         content = string.ascii_letters * random.randint(1, 10)
-        s3.meta.client.put_object(Bucket=DUMMY_BUCKET_NAME, Key=file, Body=content)
+        client.put_object(Bucket=DUMMY_BUCKET_NAME, Key=file, Body=content)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the asyncio front end."""
+import asyncio
+
+from moto import mock_s3
+from pytest import fixture, raises
+
+import s3tree
+from s3tree.aio import AsyncDirectory, AsyncFile, AsyncS3Tree
+
+from .helpers import (DUMMY_ACCESS_KEY_ID, DUMMY_BUCKET_NAME,
+                      DUMMY_SECRET_ACCESS_KEY, generate_dummy_bucket)
+
+
+@fixture(autouse=True)
+def forget_verified_buckets():
+    s3tree.core._verified_buckets.clear()
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def make_tree(**kwargs):
+    return AsyncS3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        **kwargs
+    )
+
+
+@mock_s3
+def test_async_tree_sanity():
+    generate_dummy_bucket()
+
+    async def main():
+        tree = await make_tree()
+        assert len(tree) == 7
+        assert tree.num_directories == 3
+        assert isinstance(tree[0], AsyncDirectory)
+        assert isinstance(tree[-1], AsyncFile)
+
+        child_tree = await tree.directories[1].get_tree()
+        assert isinstance(child_tree, AsyncS3Tree)
+        contents = await child_tree.files[0].read()
+        assert contents.startswith("abcd")
+
+        entries = [obj.name async for obj in make_tree(page_size=2).iter_entries()]
+        assert len(entries) == 7
+
+    run(main())
+
+
+@mock_s3
+def test_async_walk():
+    generate_dummy_bucket()
+
+    async def main():
+        paths = [path async for path, _, _ in make_tree().walk(max_depth=1)]
+        assert sorted(paths) == ["", "cache/", "css/", "js/"]
+
+    run(main())
+
+
+@mock_s3
+def test_async_tree_bucket_not_found():
+    with raises(s3tree.exceptions.BucketNotFound):
+        run(make_tree().load())
+
+
+@mock_s3
+def test_async_tree_makes_requests_in_coroutines():
+    generate_dummy_bucket()
+
+    async def main():
+        tree = make_tree()
+
+        with raises(s3tree.exceptions.TreeNotLoadedError):
+            len(tree)
+
+        # only the attributes which never make requests are forwarded
+        with raises(AttributeError):
+            tree.client
+
+        paths = sorted([f.path async for f in tree.find()])
+        assert len(paths) == 12
+        assert [f.name async for f in tree.glob("css/*.css")] == ["base.css"]
+
+        results = {f.name: data async for f, data in tree.read_many(encoding=None)}
+        assert isinstance(results["Makefile"], bytes)
+
+        stats = await tree.stats()
+        assert stats.num_files == 12
+
+        await tree
+        assert tree.num_files == 4
+        assert await tree.fetch_metadata(tree.files) == []
+        assert tree.files[0].metadata == {}
+
+        with raises(AttributeError):
+            tree.files[0].open
+
+        chunks = [chunk async for chunk in tree.files[0].iter_chunks(chunk_size=2)]
+        assert b"".join(chunks) == await tree.files[0].read_bytes()
+
+    run(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for backends module."""
+
+import os
+
+import mock
+from boto3 import Session
+from botocore.exceptions import ClientError
+from moto import mock_s3
+from pytest import fixture, raises
+
+import s3tree
+from s3tree.backends import FilesystemBackend, MemoryBackend
+from s3tree.listing import iter_pages
+
+from .helpers import (DUMMY_ACCESS_KEY_ID, DUMMY_BUCKET_NAME,
+                      DUMMY_SECRET_ACCESS_KEY, generate_dummy_bucket)
+
+
+@fixture
+def backend():
+    backend = MemoryBackend()
+    generate_dummy_bucket(backend)
+    return backend
+
+
+def listed(pages):
+    return [
+        (
+            [p["Prefix"] for p in page.get("CommonPrefixes", [])],
+            [o["Key"] for o in page.get("Contents", [])],
+        )
+        for page in pages
+    ]
+
+
+@mock_s3
+def test_memory_backend_lists_like_s3(backend):
+    session = Session(
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    client = session.client("s3", region_name="us-east-1")
+    generate_dummy_bucket(client)
+
+    for params in (
+        {},
+        {"delimiter": "/"},
+        {"delimiter": "/", "page_size": 1},
+        {"prefix": "cache/", "delimiter": "/", "page_size": 2},
+        {"prefix": "js/v", "page_size": 2},
+        {"delimiter": "/", "start_after": "css/app.less"},
+        {"prefix": "missing/", "delimiter": "/"},
+    ):
+        assert listed(iter_pages(backend, DUMMY_BUCKET_NAME, **params)) == listed(
+            iter_pages(client, DUMMY_BUCKET_NAME, **params)
+        )
+
+
+def test_memory_backend_get_object(backend):
+    backend.put_object(Bucket=DUMMY_BUCKET_NAME, Key="data.bin", Body=b"0123456789")
+
+    def read(**kwargs):
+        response = backend.get_object(
+            Bucket=DUMMY_BUCKET_NAME, Key="data.bin", **kwargs
+        )
+        return response["Body"].read()
+
+    assert read() == b"0123456789"
+    assert read(Range="bytes=2-4") == b"234"
+    assert read(Range="bytes=8-") == b"89"
+    assert read(Range="bytes=-3") == b"789"
+    assert read(Range="bytes=5-100") == b"56789"
+
+    etag = backend.head_object(Bucket=DUMMY_BUCKET_NAME, Key="data.bin")["ETag"]
+    assert read(IfMatch=etag) == b"0123456789"
+
+    for kwargs, code in (
+        ({"Range": "bytes=10-"}, "InvalidRange"),
+        ({"IfMatch": '"other"'}, "PreconditionFailed"),
+        ({"IfNoneMatch": etag}, "304"),
+    ):
+        with raises(ClientError) as exc:
+            read(**kwargs)
+        assert exc.value.response["Error"]["Code"] == code
+
+    with raises(backend.exceptions.NoSuchKey):
+        backend.get_object(Bucket=DUMMY_BUCKET_NAME, Key="missing")
+
+    with raises(ClientError):
+        backend.head_bucket(Bucket="missing")
+
+
+def test_tree_on_memory_backend(backend):
+    tree = s3tree.S3Tree(bucket_name=DUMMY_BUCKET_NAME, backend=backend)
+    assert len(tree) == 7
+    assert [obj.name for obj in tree][:3] == ["cache", "css", "js"]
+    assert tree.directories[1].get_tree().backend is backend
+
+    index_js = tree.files[-1]
+    assert index_js.read() == index_js.read_bytes().decode("utf-8")
+    assert index_js.download(bytearray(index_js.size_in_bytes), verify=True)
+
+    assert len([f for _, _, files in tree.walk() for f in files]) == 12
+    assert len(s3tree.S3Tree(DUMMY_BUCKET_NAME, backend=backend, shards=3)) == 7
+
+    with raises(s3tree.exceptions.BucketNotFound):
+        s3tree.S3Tree(bucket_name="missing", backend=backend)
+
+
+def test_tree_on_filesystem_backend(tmpdir):
+    bucket = tmpdir.mkdir("bucket")
+    bucket.join("index.html").write("<html></html>")
+    bucket.mkdir("css").join("base.css").write("body {}")
+    bucket.mkdir("js").mkdir("vendor").join("react.js").write("react")
+
+    backend = FilesystemBackend(str(tmpdir))
+    tree = s3tree.S3Tree(bucket_name="bucket", backend=backend)
+    assert [obj.name for obj in tree] == ["css", "js", "index.html"]
+    assert tree.files[0].read() == "<html></html>"
+    assert tree.files[0].read_range(-7) == b"</html>"
+    assert [f.path for f in tree.find()] == [
+        "css/base.css",
+        "index.html",
+        "js/vendor/react.js",
+    ]
+
+    head = backend.head_object(Bucket="bucket", Key="css/base.css")
+    assert head["ContentType"] == "text/css"
+    assert head["ContentLength"] == 7
+
+    for key in ("../bucket/index.html", "css//base.css", "css"):
+        with raises(backend.exceptions.NoSuchKey):
+            backend.get_object(Bucket="bucket", Key=key)
+
+
+def test_filesystem_backend_walks_directories_once(tmpdir):
+    bucket = tmpdir.mkdir("bucket")
+    bucket.join("index.html").write("<html></html>")
+    images = bucket.mkdir("images")
+
+    for i in range(10):
+        images.join("{}.png".format(i)).write("png")
+
+    backend = FilesystemBackend(str(tmpdir))
+
+    with mock.patch("os.walk", wraps=os.walk) as walk:
+        tree = s3tree.S3Tree(
+            bucket_name="bucket", path="images", backend=backend, page_size=3
+        )
+        assert tree.num_files == 10
+        # only the directory of the prefix is walked, once for all the pages
+        walk.assert_called_once_with(str(images))
+
+        images.join("10.png").write("png")
+        tree = s3tree.S3Tree(bucket_name="bucket", path="images", backend=backend)
+        assert tree.num_files == 11
+        assert walk.call_count == 2
+
+
+@mock_s3
+def test_boto3_client_is_not_a_backend():
+    client = Session(
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    ).client("s3", region_name="us-east-1")
+
+    with raises(s3tree.exceptions.InvalidBackendError):
+        s3tree.S3Tree(bucket_name=DUMMY_BUCKET_NAME, backend=client)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the listing caches."""
+import datetime
+
+import pytest
+from dateutil.tz import tzutc
+
+from s3tree.cache import ListingCache, MemoryCache
+
+
+@pytest.fixture
+def pages():
+    return [
+        {
+            u"CommonPrefixes": [{u"Prefix": "admin/img/gis/"}],
+            u"Contents": [
+                {
+                    u"ETag": '"2152fd3b4a4dd92fef70a86e50e1453b"',
+                    u"Key": "admin/img/tooltag-add.png",
+                    u"LastModified": datetime.datetime(
+                        2018, 3, 16, 13, 25, 59, tzinfo=tzutc()
+                    ),
+                    u"Size": 2048,
+                    u"StorageClass": "STANDARD",
+                }
+            ],
+            u"KeyCount": 2,
+            u"IsTruncated": False,
+        }
+    ]
+
+
+def test_listing_cache_round_trip(tmpdir, pages):
+    cache = ListingCache(str(tmpdir.join("cache.db")))
+    key = (None, "dummy", "admin/img/", "/")
+    assert cache.get(key) is None
+
+    cache.set(key, pages)
+    assert (cache.hits, cache.misses) == (0, 1)
+    cached = ListingCache(str(tmpdir.join("cache.db"))).get(key)
+    assert cached[0]["CommonPrefixes"] == pages[0]["CommonPrefixes"]
+    assert cached[0]["Contents"] == pages[0]["Contents"]
+    assert cached[0]["KeyCount"] == 2
+
+
+def test_listing_cache_ttl(tmpdir, pages):
+    cache = ListingCache(str(tmpdir.join("cache.db")), ttl=0)
+    cache.set("key", pages)
+    assert cache.get("key") is None
+
+
+def test_listing_cache_evicts_least_recently_used(tmpdir, pages):
+    cache = ListingCache(str(tmpdir.join("cache.db")), max_entries=2)
+    cache.set("a", pages)
+    cache.set("b", pages)
+    cache.get("a")
+    cache.set("c", pages)
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", b"foo")
+    cache.set("b", b"bar")
+    cache.get("a")
+    cache.set("c", b"baz")
+    assert cache.get("a") == b"foo"
+    assert cache.get("b") is None
+    assert cache.get("c") == b"baz"
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+
+def test_memory_cache_max_bytes(pages):
+    cache = MemoryCache(max_bytes=10)
+    cache.set("a", b"12345")
+    cache.set("b", b"123456")
+    assert cache.get("a") is None
+    assert cache.size == 6
+
+    # values larger than the cache are never cached
+    cache.set("c", b"12345678901")
+    assert cache.get("c") is None
+    cache.set("pages", pages)
+    assert cache.get("pages") is None
+
+
+def test_memory_cache_ttl():
+    cache = MemoryCache(ttl=0)
+    cache.set("a", b"foo")
+    assert cache.get("a") is None
+    assert cache.get("a", stale=True) == b"foo"
+    assert cache.hits == 0
+
+
+def test_memory_cache_lookup():
+    cache = MemoryCache(ttl=60)
+    assert cache.lookup("a") == (None, False)
+    cache.set("a", b"foo")
+    assert cache.lookup("a") == (b"foo", True)
+    cache.ttl = 0
+    assert cache.lookup("a") == (b"foo", False)
+
+    # lookups are only counted when recorded
+    assert (cache.hits, cache.misses) == (0, 0)
+    cache.record(True)
+    cache.record(False)
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -4,15 +4,27 @@
 
 import json
 
+import mock
+from botocore.client import BaseClient
+from botocore.exceptions import ClientError
 from moto import mock_s3
-from pytest import fail, raises
-from six import string_types
+from pytest import fail, fixture, raises
+from six import StringIO, string_types
 
 import s3tree
 
 from .helpers import (DUMMY_ACCESS_KEY_ID, DUMMY_BUCKET_NAME,
                       DUMMY_SECRET_ACCESS_KEY, generate_dummy_bucket)
 
+_make_api_call = BaseClient._make_api_call
+
+
+@fixture(autouse=True)
+def forget_verified_buckets():
+    # every test gets a fresh mocked S3, so buckets verified in one test
+    # should not be remembered in the next one.
+    s3tree.core._verified_buckets.clear()
+
 
 def test_s3tree_improperly_configured():
     with raises(s3tree.exceptions.ImproperlyConfiguredError):
@@ -112,6 +124,56 @@ def test_file_reads():
     assert dummy_file.read().startswith("abcd")
 
 
+@mock_s3
+def test_file_streaming_and_ranged_reads():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        path="css",
+    )
+    dummy_file = tree[0]
+    contents = dummy_file.read_bytes()
+    assert isinstance(contents, bytes)
+    assert dummy_file.read_bytes(encoding="utf-8") == dummy_file.read()
+
+    assert b"".join(dummy_file.iter_chunks(chunk_size=10)) == contents
+    assert dummy_file.open().read(4) == b"abcd"
+
+    assert dummy_file.read_range(0, 4) == b"abcd"
+    assert dummy_file.read_range(10) == contents[10:]
+    assert dummy_file.read_range(-3) == contents[-3:]
+    assert dummy_file.read_range(4, 2) == b""
+    assert dummy_file.read_range(len(contents) + 10) == b""
+
+
+@mock_s3
+def test_file_parallel_download(tmpdir):
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        path="css",
+    )
+    dummy_file = tree[0]
+    contents = dummy_file.read_bytes()
+
+    dest = str(tmpdir.join("app.less"))
+    dummy_file.download(dest, part_size=7, max_workers=3, verify=True)
+    with open(dest, "rb") as fp:
+        assert fp.read() == contents
+
+    buf = dummy_file.download(bytearray(len(contents)), part_size=7, verify=True)
+    assert bytes(buf) == contents
+
+    # the object has changed since it was listed
+    dummy_file.etag = '"0123456789abcdef0123456789abcdef"'
+    with raises(s3tree.exceptions.DownloadVerificationError):
+        dummy_file.download(bytearray(len(contents)), part_size=7)
+
+
 @mock_s3
 def test_tree_as_json_property():
     generate_dummy_bucket()
@@ -125,3 +187,736 @@ def test_tree_as_json_property():
     assert isinstance(json_data, string_types)
     assert isinstance(data, list)
     assert len(data) == 7
+
+
+@mock_s3
+def test_tree_is_listed_page_by_page():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        page_size=2,
+    )
+    # the tree spans over 4 pages, and none of the entries should be lost
+    assert len(tree) == 7
+    assert tree.num_directories == 3
+    assert tree.num_files == 4
+    assert sorted(obj.name for obj in tree) == sorted(
+        obj.name for obj in tree.iter_entries()
+    )
+
+
+@mock_s3
+def test_iter_entries_streams_remaining_pages():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        page_size=2,
+    )
+    entries = list(tree.iter_entries())
+    assert len(entries) == 7
+    assert entries[0] is tree[0]
+
+
+@mock_s3
+def test_lazy_tree_makes_no_requests_until_accessed():
+    tree = s3tree.S3Tree(
+        bucket_name="non-existent-bucket",
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        lazy=True,
+    )
+    with raises(s3tree.exceptions.BucketNotFound):
+        len(tree)
+
+
+@mock_s3
+def test_lazy_tree_iter_entries():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        page_size=2,
+        lazy=True,
+    )
+    assert len(list(tree.iter_entries())) == 7
+
+
+@mock_s3
+def test_bucket_check_is_made_once_per_bucket():
+    generate_dummy_bucket()
+    s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    with mock.patch.object(
+        BaseClient, "_make_api_call", autospec=True, side_effect=_make_api_call
+    ) as api_call:
+        tree = s3tree.S3Tree(
+            bucket_name=DUMMY_BUCKET_NAME,
+            aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+            aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+            path="css",
+        )
+        assert len(tree) == 2
+
+    operations = [c[0][1] for c in api_call.call_args_list]
+    assert operations == ["ListObjectsV2"]
+
+
+@mock_s3
+def test_child_trees_share_the_client():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    child_tree = tree.directories[0].get_tree()
+    assert child_tree.client is tree.client
+    assert (
+        tree.client.meta.config.max_pool_connections
+        == s3tree.config.max_pool_connections
+    )
+
+
+@mock_s3
+def test_walk_lists_every_file():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        page_size=2,
+    )
+    walked = [f.path for _, _, files in tree.walk(max_workers=4) for f in files]
+    keys = [
+        o["Key"]
+        for o in tree.client.list_objects_v2(Bucket=DUMMY_BUCKET_NAME)["Contents"]
+    ]
+    assert sorted(walked) == sorted(keys)
+
+
+@mock_s3
+def test_walk_max_depth():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    assert [path for path, _, _ in tree.walk(max_depth=0)] == [""]
+    assert sorted(path for path, _, _ in tree.walk(max_depth=1)) == [
+        "",
+        "cache/",
+        "css/",
+        "js/",
+    ]
+
+
+@mock_s3
+def test_flat_listing_serves_child_trees_from_memory():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        listing="flat",
+        page_size=5,
+    )
+    assert len(tree) == 7
+    assert [d.name for d in tree.directories] == ["cache", "css", "js"]
+
+    level_tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    level_walk = sorted((p, len(d), len(f)) for p, d, f in level_tree.walk())
+
+    with mock.patch.object(
+        BaseClient, "_make_api_call", autospec=True, side_effect=_make_api_call
+    ) as api_call:
+        child_tree = tree.directories[0].get_tree()
+        assert len(child_tree) == 2
+        assert [d.name for d in child_tree.directories] == ["staticfiles"]
+        assert sorted((p, len(d), len(f)) for p, d, f in tree.walk()) == level_walk
+
+    assert not api_call.called
+
+
+@mock_s3
+def test_flat_and_level_listings_have_the_same_order():
+    generate_dummy_bucket()
+
+    for page_size in (2, None):
+        trees = [
+            s3tree.S3Tree(
+                bucket_name=DUMMY_BUCKET_NAME,
+                aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+                aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+                listing=listing,
+                page_size=page_size,
+            )
+            for listing in ("level", "flat")
+        ]
+        level_entries, flat_entries = [[obj.path for obj in t] for t in trees]
+        assert level_entries == flat_entries
+
+        if page_size is not None:
+            # the directories and files of every page follow each other
+            assert level_entries[:3] == ["Makefile", "__init__.py", "cache/"]
+
+
+@mock_s3
+def test_auto_listing_falls_back_to_level_listing(monkeypatch):
+    generate_dummy_bucket()
+    monkeypatch.setattr(s3tree.config, "flat_listing_threshold", 5)
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        listing="auto",
+        page_size=2,
+    )
+    assert len(tree) == 7
+
+    # the tree under `css` holds few enough keys to be listed flat
+    child_tree = tree.directories[1].get_tree()
+    assert len(child_tree) == 2
+
+
+def test_invalid_listing_mode():
+    with raises(s3tree.exceptions.InvalidListingModeError):
+        s3tree.S3Tree(
+            bucket_name=DUMMY_BUCKET_NAME,
+            aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+            aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+            listing="foo",
+        )
+
+
+@mock_s3
+def test_read_many():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    contents = {f.name: f.read() for f in tree.files}
+
+    results = list(tree.read_many(max_workers=2))
+    assert sorted(f.name for f, _ in results) == sorted(contents)
+    assert all(contents[f.name] == data for f, data in results)
+
+    # in order, one file at a time, and only the files matching the predicate
+    results = tree.read_many(
+        lambda f: f.name.endswith(".py") or f.name.endswith(".js"),
+        as_completed=False,
+        max_inflight_bytes=1,
+    )
+    assert [f.name for f, _ in results] == ["__init__.py", "index.js"]
+
+    # files which can't be read yield their error
+    tree.client.delete_object(Bucket=DUMMY_BUCKET_NAME, Key="index.js")
+    results = dict((f.name, data) for f, data in tree.read_many(encoding=None))
+    assert isinstance(results["index.js"], s3tree.exceptions.FileNotFound)
+    assert isinstance(results["Makefile"], bytes)
+
+
+@mock_s3
+def test_listings_are_served_from_the_cache(tmpdir):
+    generate_dummy_bucket()
+    cache = s3tree.cache.ListingCache(str(tmpdir.join("cache.db")))
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        cache=cache,
+    )
+    assert len(tree) == 7
+    s3tree.core._verified_buckets.clear()
+
+    with mock.patch.object(
+        BaseClient, "_make_api_call", autospec=True, side_effect=_make_api_call
+    ) as api_call:
+        cached_tree = s3tree.S3Tree(
+            bucket_name=DUMMY_BUCKET_NAME,
+            aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+            aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+            cache=cache,
+        )
+        assert [obj.name for obj in cached_tree] == [obj.name for obj in tree]
+        assert cached_tree.as_json == tree.as_json
+
+    assert not api_call.called
+
+    # listings cached with other credentials are not used
+    with mock.patch.object(
+        BaseClient, "_make_api_call", autospec=True, side_effect=_make_api_call
+    ) as api_call:
+        s3tree.S3Tree(
+            bucket_name=DUMMY_BUCKET_NAME,
+            aws_access_key_id="other-access-key",
+            aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+            cache=cache,
+        )
+
+    assert [c[0][1] for c in api_call.call_args_list] == ["HeadBucket", "ListObjectsV2"]
+
+
+@mock_s3
+def test_file_contents_are_served_from_the_body_cache():
+    generate_dummy_bucket()
+    cache = s3tree.cache.MemoryCache()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        path="css",
+        body_cache=cache,
+    )
+    dummy_file = tree[0]
+    contents = dummy_file.read()
+
+    with mock.patch.object(
+        BaseClient, "_make_api_call", autospec=True, side_effect=_make_api_call
+    ) as api_call:
+        assert dummy_file.read() == contents
+
+        # stale contents are revalidated, and not downloaded again
+        cache.ttl = 0
+        assert dummy_file.read() == contents
+
+    assert [c[0][2].get("IfNoneMatch") for c in api_call.call_args_list] == [
+        dummy_file.etag
+    ]
+    # revalidated contents are counted as hits
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    # changed contents are downloaded again, and counted as a single miss
+    cache.ttl = 60
+    tree.client.put_object(Bucket=DUMMY_BUCKET_NAME, Key=dummy_file.path, Body="a {}")
+    changed_file = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        path="css",
+        body_cache=cache,
+    )[0]
+    assert changed_file.read() == "a {}"
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    # contents cached with other credentials are not used
+    other_file = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id="other-access-key",
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        path="css",
+        body_cache=cache,
+    )[0]
+
+    with mock.patch.object(
+        BaseClient, "_make_api_call", autospec=True, side_effect=_make_api_call
+    ) as api_call:
+        assert other_file.read() == "a {}"
+
+    assert [c[0][1] for c in api_call.call_args_list] == ["GetObject"]
+
+
+@mock_s3
+def test_fetch_metadata_detects_file_type():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    tree.client.put_object(
+        Bucket=DUMMY_BUCKET_NAME, Key="Makefile", Body="all:", ContentType="text/plain"
+    )
+    makefile = [f for f in tree.files if f.name == "Makefile"][0]
+    assert makefile.file_type is None
+
+    assert tree.fetch_metadata([makefile]) == []
+    assert makefile.content_type == "text/plain"
+    assert makefile.file_type == "text"
+
+
+@mock_s3
+def test_fetch_metadata():
+    generate_dummy_bucket()
+    metrics = s3tree.metrics.Metrics()
+    cache = s3tree.cache.MemoryCache()
+
+    def make_tree():
+        return s3tree.S3Tree(
+            bucket_name=DUMMY_BUCKET_NAME,
+            aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+            aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+            metrics=metrics,
+        )
+
+    make_tree().client.put_object(
+        Bucket=DUMMY_BUCKET_NAME,
+        Key="Makefile",
+        Body="all:",
+        ContentType="text/plain",
+        Metadata={"owner": "web"},
+    )
+    tree = make_tree()
+    assert all(f.metadata is None for f in tree.files)
+
+    tree.fetch_metadata(max_workers=2, cache=cache)
+    makefile = [f for f in tree.files if f.name == "Makefile"][0]
+    assert makefile.content_type == "text/plain"
+    assert makefile.metadata == {"owner": "web"}
+    assert all(f.metadata is not None for f in tree.files)
+    assert metrics.operations["HeadObject"].count == tree.num_files
+    assert "GetObject" not in metrics.operations
+
+    # unchanged files are served from the cache
+    make_tree().fetch_metadata(cache=cache)
+    assert metrics.operations["HeadObject"].count == tree.num_files
+    assert metrics.cache_hits["metadata"] == tree.num_files
+
+    tree.client.put_object(
+        Bucket=DUMMY_BUCKET_NAME, Key="Makefile", Body="all: test", Metadata={}
+    )
+    tree = make_tree()
+    tree.fetch_metadata(cache=cache)
+    makefile = [f for f in tree.files if f.name == "Makefile"][0]
+    assert makefile.metadata == {}
+    assert metrics.operations["HeadObject"].count == tree.num_files + 1
+
+
+@mock_s3
+def test_fetch_metadata_of_deleted_file():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    deleted_file = tree.files[0]
+    tree.client.delete_object(Bucket=DUMMY_BUCKET_NAME, Key=deleted_file.path)
+
+    [(file_obj, error)] = tree.fetch_metadata()
+    assert file_obj is deleted_file
+    assert isinstance(error, s3tree.exceptions.FileNotFound)
+    assert deleted_file.metadata is None
+    # the metadata of the other files is still fetched
+    assert all(f.metadata == {} for f in tree.files[1:])
+
+
+@mock_s3
+def test_diff_against_snapshot():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        path="js",
+    )
+    snapshot = tree.snapshot()
+    assert len(snapshot) == 3
+
+    client = tree.client
+    client.put_object(Bucket=DUMMY_BUCKET_NAME, Key="js/zepto.js", Body="$")
+    client.put_object(Bucket=DUMMY_BUCKET_NAME, Key="js/vendor/angular.js", Body="")
+    client.delete_object(Bucket=DUMMY_BUCKET_NAME, Key="js/vendor/angular.min.js")
+
+    changes = tree.diff(snapshot)
+    assert [f.path for f in changes.added] == ["js/zepto.js"]
+    assert [f.path for f in changes.modified] == ["js/vendor/angular.js"]
+    assert changes.removed == ["js/vendor/angular.min.js"]
+
+    changes = tree.diff(snapshot, new_keys_only=True)
+    assert [f.path for f in changes.added] == ["js/zepto.js"]
+    assert changes.modified == changes.removed == []
+
+
+@mock_s3
+def test_tree_dump():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    fp = StringIO()
+    tree.dump(fp)
+    assert fp.getvalue() == tree.as_json
+
+    # entries are in the same order when the tree is listed in many pages
+    paged_tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        page_size=2,
+    )
+    fp = StringIO()
+    paged_tree.dump(fp)
+    assert fp.getvalue() == paged_tree.as_json
+
+    fp = StringIO()
+    tree.dump(fp, format="ndjson", recursive=True)
+    lines = fp.getvalue().splitlines()
+    assert len(lines) == 12
+    assert json.loads(lines[0])["path"] == "Makefile"
+
+    with raises(s3tree.exceptions.InvalidDumpFormatError):
+        tree.dump(fp, format="xml")
+
+
+@mock_s3
+def test_tree_stats():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    stats = tree.stats()
+    assert stats.num_files == 12
+    assert stats.total_bytes == sum(
+        f.size_in_bytes for _, _, files in tree.walk() for f in files
+    )
+    assert stats.by_directory["js"]["files"] == 3
+
+    stats = tree.stats(recursive=False)
+    assert stats.num_files == 4
+    assert stats.num_directories == 3
+    assert stats.by_directory == {}
+
+
+@mock_s3
+def test_tree_glob():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+
+    def glob(pattern):
+        return sorted(f.path for f in tree.glob(pattern))
+
+    assert glob("*.js") == ["index.js"]
+    assert glob("**/*.js") == [
+        "index.js",
+        "js/vendor/angular.js",
+        "js/vendor/angular.min.js",
+        "js/vendor/latest/react.js",
+    ]
+    assert glob("/js/*/*.js") == ["js/vendor/angular.js", "js/vendor/angular.min.js"]
+    assert glob("c*/*.[lr]*") == ["cache/foo.rb", "css/app.less"]
+    assert glob("cache/**/logs.txt") == ["cache/staticfiles/logs.txt"]
+
+    # directories which can't match are never listed
+    with mock.patch.object(
+        BaseClient, "_make_api_call", autospec=True, side_effect=_make_api_call
+    ) as api_call:
+        assert glob("j*/vendor/*.js") == [
+            "js/vendor/angular.js",
+            "js/vendor/angular.min.js",
+        ]
+
+    prefixes = [c[0][2]["Prefix"] for c in api_call.call_args_list]
+    assert prefixes == ["j", "js/vendor/"]
+
+
+@mock_s3
+def test_tree_find():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        path="js",
+    )
+    assert len(list(tree.find())) == 3
+    assert len(list(tree.find(storage_class="GLACIER"))) == 0
+    assert len(list(tree.find(min_size=10 ** 6))) == 0
+    assert [f.name for f in tree.find(lambda f: f.name.startswith("react"))] == [
+        "react.js"
+    ]
+
+    last_modified = max(f.last_modified for f in tree.find())
+    assert len(list(tree.find(modified_after=last_modified))) == 0
+
+
+@mock_s3
+def test_sharded_listing():
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+
+    for options in ({"shards": 4}, {"shard_boundaries": ["css/base.css", "js/"]}):
+        sharded_tree = s3tree.S3Tree(
+            bucket_name=DUMMY_BUCKET_NAME,
+            aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+            aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+            page_size=2,
+            **options
+        )
+        # pages are cut at other keys, so only the directories and files are
+        # in the same order as in the tree
+        assert [d.as_dict for d in sharded_tree.directories] == [
+            d.as_dict for d in tree.directories
+        ]
+        assert [f.as_dict for f in sharded_tree.files] == [
+            f.as_dict for f in tree.files
+        ]
+        assert sorted(obj.name for obj in sharded_tree.iter_entries()) == sorted(
+            obj.name for obj in tree
+        )
+        assert len(list(sharded_tree.find())) == 12
+
+        js_tree = sharded_tree.directories[2].get_tree()
+        assert js_tree.shards == sharded_tree.shards
+        assert [obj.name for obj in js_tree] == ["vendor"]
+
+
+@mock_s3
+def test_requests_are_retried():
+    generate_dummy_bucket()
+    errors = [ClientError({"Error": {"Code": "SlowDown"}}, "ListObjectsV2")]
+
+    def flaky_api_call(client, operation_name, params):
+        if operation_name == "ListObjectsV2" and errors:
+            raise errors.pop()
+        return _make_api_call(client, operation_name, params)
+
+    with mock.patch.object(
+        BaseClient, "_make_api_call", autospec=True, side_effect=flaky_api_call
+    ):
+        tree = s3tree.S3Tree(
+            bucket_name=DUMMY_BUCKET_NAME,
+            aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+            aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+            retry_policy=s3tree.retry.RetryPolicy(base_delay=0),
+        )
+        assert len(tree) == 7
+        assert tree.retry_policy.retries == 1
+        assert tree.directories[0].get_tree().retry_policy is tree.retry_policy
+
+
+@mock_s3
+def test_bucket_errors_with_named_codes():
+    generate_dummy_bucket()
+
+    for code, exception in (
+        ("NoSuchBucket", s3tree.exceptions.BucketNotFound),
+        ("AccessDenied", s3tree.exceptions.BucketAccessDenied),
+    ):
+        s3tree.core._verified_buckets.clear()
+        error = ClientError({"Error": {"Code": code}}, "HeadBucket")
+
+        with mock.patch.object(BaseClient, "_make_api_call", side_effect=error):
+            with raises(exception):
+                s3tree.S3Tree(
+                    bucket_name=DUMMY_BUCKET_NAME,
+                    aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+                    aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+                )
+
+
+@mock_s3
+def test_walk_resumes_from_checkpoint(tmpdir):
+    generate_dummy_bucket()
+    checkpoint = str(tmpdir.join("walk.json"))
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        page_size=2,
+    )
+
+    walk = tree.walk(max_workers=1, checkpoint=checkpoint, checkpoint_interval=0)
+    _, _, files = next(walk)
+    processed = [f.path for f in files]
+    # the walk stops while the second page is processed
+    next(walk)
+    walk.close()
+    assert tmpdir.join("walk.json").check()
+
+    for _, _, files in tree.walk(max_workers=1, checkpoint=checkpoint):
+        processed.extend(f.path for f in files)
+
+    assert sorted(processed) == sorted(f.path for f in tree.find())
+    assert not tmpdir.join("walk.json").check()
+
+    walk = tree.walk(checkpoint=checkpoint)
+    next(walk)
+    next(walk)
+    walk.close()
+
+    with raises(s3tree.exceptions.InvalidCheckpointError):
+        next(tree.directories[2].get_tree().walk(checkpoint=checkpoint))
+
+    # a checkpoint with no listings left is of a complete walk
+    s3tree.checkpoint.WalkCheckpoint(checkpoint, DUMMY_BUCKET_NAME, "").save([])
+    assert list(tree.walk(checkpoint=checkpoint)) == []
+    assert not tmpdir.join("walk.json").check()
+
+
+@mock_s3
+def test_walk_checkpoint_is_saved_at_an_interval(tmpdir):
+    generate_dummy_bucket()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        page_size=2,
+    )
+
+    with mock.patch.object(
+        s3tree.checkpoint.WalkCheckpoint,
+        "save",
+        autospec=True,
+        side_effect=s3tree.checkpoint.WalkCheckpoint.save,
+    ) as save:
+        steps = list(tree.walk(checkpoint=str(tmpdir.join("walk.json"))))
+
+    # only after the first page, since the walk takes less than the interval
+    assert len(steps) > 1
+    assert save.call_count == 1
+
+
+@mock_s3
+def test_requests_are_recorded_in_metrics():
+    generate_dummy_bucket()
+    metrics = s3tree.metrics.Metrics()
+    tree = s3tree.S3Tree(
+        bucket_name=DUMMY_BUCKET_NAME,
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+        body_cache=s3tree.cache.MemoryCache(),
+        metrics=metrics,
+    )
+    tree.directories[1].get_tree()
+    contents = tree.files[0].read_bytes()
+    tree.files[0].read_bytes()
+
+    operations = metrics.operations
+    assert operations["HeadBucket"].count == 1
+    assert operations["ListObjectsV2"].count == 2
+    assert operations["GetObject"].count == 1
+    assert operations["GetObject"].bytes == len(contents)
+    assert metrics.cache_hits == {"body": 1}
+    assert metrics.cache_misses == {"body": 1}
+
+    with raises(s3tree.exceptions.FileNotFound):
+        s3tree.models.File({"Key": "missing"}, tree).read_bytes()
+
+    assert operations["GetObject"].errors == 1
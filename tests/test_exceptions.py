@@ -1,8 +1,12 @@
 from pytest import raises
 
 from s3tree.exceptions import (BucketAccessDenied, BucketNotFound,
-                               DirectoryNotFound, FileNotFound,
-                               ImproperlyConfiguredError, InvalidPathError)
+                               DirectoryNotFound, DownloadVerificationError,
+                               FileNotFound, ImproperlyConfiguredError,
+                               InvalidBackendError, InvalidCheckpointError,
+                               InvalidDumpFormatError, InvalidIndexError,
+                               InvalidListingModeError, InvalidPathError,
+                               TreeNotLoadedError)
 
 
 def test_improperly_configured_error_exc():
@@ -53,3 +57,63 @@ def test_directory_not_found_exc():
         raise DirectoryNotFound("foo/bar")
 
     assert str(exc.value) == "Directory could not be found: foo/bar"
+
+
+def test_invalid_listing_mode_error_exc():
+    with raises(InvalidListingModeError) as exc:
+        raise InvalidListingModeError("foo")
+
+    assert str(exc.value) == (
+        "Invalid listing mode: foo." " Must be one of level, flat or auto."
+    )
+
+
+def test_download_verification_error_exc():
+    with raises(DownloadVerificationError) as exc:
+        raise DownloadVerificationError("foo/bar.py")
+
+    assert str(exc.value) == (
+        "Downloaded contents do not match the ETag of the file: foo/bar.py"
+    )
+
+
+def test_invalid_dump_format_error_exc():
+    with raises(InvalidDumpFormatError) as exc:
+        raise InvalidDumpFormatError("xml")
+
+    assert str(exc.value) == (
+        "Invalid dump format: xml." " Must be one of json or ndjson."
+    )
+
+
+def test_invalid_checkpoint_exc():
+    with raises(InvalidCheckpointError) as exc:
+        raise InvalidCheckpointError("walk.json")
+
+    assert str(exc.value) == "Checkpoint was not made by a walk of this tree: walk.json"
+
+
+def test_invalid_index_exc():
+    with raises(InvalidIndexError) as exc:
+        raise InvalidIndexError("tree.idx")
+
+    assert str(exc.value) == "Not a valid index file: tree.idx"
+
+
+def test_tree_not_loaded_exc():
+    with raises(TreeNotLoadedError) as exc:
+        raise TreeNotLoadedError("dummy")
+
+    assert (
+        str(exc.value) == "The tree must be awaited before accessing its entries: dummy"
+    )
+
+
+def test_invalid_backend_exc():
+    with raises(InvalidBackendError) as exc:
+        raise InvalidBackendError("https://s3.amazonaws.com")
+
+    assert str(exc.value) == (
+        "A boto3 client can't be used as a backend, use credentials instead: "
+        "https://s3.amazonaws.com"
+    )
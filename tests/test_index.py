@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for index module."""
+
+import mock
+from pytest import raises
+
+import s3tree
+from s3tree.backends import MemoryBackend
+from s3tree.index import IndexedTree, write_index
+from s3tree.models import File
+
+from .helpers import DUMMY_BUCKET_NAME, generate_dummy_bucket
+
+
+def entries(tree):
+    return [(obj.__class__.__name__, obj.path) for obj in tree]
+
+
+def test_indexed_tree_matches_tree(tmpdir):
+    backend = MemoryBackend()
+    generate_dummy_bucket(backend)
+    backend.put_object(Bucket=DUMMY_BUCKET_NAME, Key=u"js/ünïcode.js", Body=b"1")
+    tree = s3tree.S3Tree(DUMMY_BUCKET_NAME, backend=backend)
+    path = str(tmpdir.join("bucket.idx"))
+
+    assert tree.write_index(path) == 13
+    indexed_tree = IndexedTree(path, client=backend)
+
+    assert indexed_tree.bucket_name == DUMMY_BUCKET_NAME
+    assert entries(indexed_tree) == entries(tree)
+    assert indexed_tree.as_json == tree.as_json
+    assert indexed_tree.num_directories == 3
+    assert indexed_tree.num_files == 4
+
+    for directory in tree.directories:
+        assert entries(indexed_tree.get_tree(directory.path)) == entries(
+            directory.get_tree()
+        )
+
+    index_js = indexed_tree.files[-1]
+    assert index_js.etag == tree.files[-1].etag
+    assert index_js.last_modified == tree.files[-1].last_modified
+    assert index_js.read() == tree.files[-1].read()
+
+    walked = [f.path for _, _, files in indexed_tree.walk() for f in files]
+    assert sorted(walked) == sorted(f.path for f in tree.find())
+    assert len(list(indexed_tree.walk(max_depth=0))) == 1
+
+    with raises(s3tree.exceptions.DirectoryNotFound):
+        indexed_tree.get_tree("missing")
+
+
+def test_indexed_tree_builds_entries_lazily(tmpdir):
+    backend = MemoryBackend()
+    generate_dummy_bucket(backend)
+    path = str(tmpdir.join("bucket.idx"))
+    tree = s3tree.S3Tree(DUMMY_BUCKET_NAME, backend=backend)
+    tree.write_index(path)
+
+    with mock.patch("s3tree.index.File", wraps=File) as file_class:
+        indexed_tree = IndexedTree(path)
+        assert file_class.call_count == 0
+
+        assert indexed_tree[-1].path == tree[-1].path
+        assert [obj.path for obj in indexed_tree[1:3]] == [
+            obj.path for obj in tree[1:3]
+        ]
+        assert file_class.call_count == 1
+
+    with raises(IndexError):
+        indexed_tree[len(tree)]
+
+
+def test_index_of_subtree(tmpdir):
+    backend = MemoryBackend()
+    generate_dummy_bucket(backend)
+    path = str(tmpdir.join("js.idx"))
+    write_index(s3tree.S3Tree(DUMMY_BUCKET_NAME, path="js", backend=backend), path)
+
+    indexed_tree = IndexedTree(path)
+    assert indexed_tree.path == "js/"
+    assert entries(indexed_tree) == [("Directory", "js/vendor/")]
+    assert [f.name for f in indexed_tree.directories[0].get_tree().files] == [
+        "angular.js",
+        "angular.min.js",
+    ]
+
+
+def test_invalid_index(tmpdir):
+    path = tmpdir.join("invalid.idx")
+
+    for contents in ("", "not an index file, but long enough"):
+        path.write(contents)
+
+        with raises(s3tree.exceptions.InvalidIndexError):
+            IndexedTree(str(path))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for listing module."""
+
+import mock
+from boto3 import Session
+from botocore.exceptions import ClientError
+from moto import mock_s3
+from pytest import raises
+
+from s3tree.listing import (_PAGES_AHEAD, _midpoint, iter_pages,
+                            iter_sharded_pages, sample_boundaries)
+
+from .helpers import (DUMMY_ACCESS_KEY_ID, DUMMY_BUCKET_NAME,
+                      DUMMY_SECRET_ACCESS_KEY, generate_dummy_bucket)
+
+
+def get_client():
+    session = Session(
+        aws_access_key_id=DUMMY_ACCESS_KEY_ID,
+        aws_secret_access_key=DUMMY_SECRET_ACCESS_KEY,
+    )
+    return session.client("s3", region_name="us-east-1")
+
+
+def keys(pages):
+    return sorted(
+        entry.get("Prefix", entry.get("Key"))
+        for page in pages
+        for entry in page.get("CommonPrefixes", []) + page.get("Contents", [])
+    )
+
+
+def test_midpoint():
+    assert "a" < _midpoint("a", "b") < "b"
+    assert "2018-01" < _midpoint("2018-01", "2018-12") < "2018-12"
+    assert _midpoint("a", "a") == "a"
+
+
+@mock_s3
+def test_sample_boundaries():
+    generate_dummy_bucket()
+    client = get_client()
+    all_keys = keys(iter_pages(client, DUMMY_BUCKET_NAME))
+
+    boundaries = sample_boundaries(client, DUMMY_BUCKET_NAME, 4)
+    assert len(boundaries) == 3
+    assert boundaries == sorted(boundaries)
+    assert set(boundaries) <= set(all_keys)
+
+    boundaries = sample_boundaries(client, DUMMY_BUCKET_NAME, 4, prefix="css/")
+    assert boundaries == ["css/app.less", "css/base.css"]
+
+
+@mock_s3
+def test_sharded_pages_match_sequential_pages():
+    generate_dummy_bucket()
+    client = get_client()
+
+    for delimiter in (None, "/"):
+        expected = keys(iter_pages(client, DUMMY_BUCKET_NAME, delimiter=delimiter))
+
+        for boundaries in ([], ["css/app.less"], ["a", "cache/", "js/vendor/x"]):
+            pages = iter_sharded_pages(
+                client,
+                DUMMY_BUCKET_NAME,
+                boundaries,
+                delimiter=delimiter,
+                page_size=1,
+            )
+            assert keys(pages) == expected
+
+        pages = list(iter_sharded_pages(client, DUMMY_BUCKET_NAME, ["a"], prefix="x/"))
+        assert pages == [{"CommonPrefixes": [], "Contents": [], "KeyCount": 0}]
+
+
+@mock_s3
+def test_sharded_pages_are_streamed():
+    generate_dummy_bucket()
+    client = get_client()
+
+    with mock.patch.object(
+        client, "list_objects_v2", wraps=client.list_objects_v2
+    ) as list_objects:
+        pages = iter_sharded_pages(
+            client, DUMMY_BUCKET_NAME, ["css/app.less"], page_size=1
+        )
+        first_page = next(pages)
+        pages.close()
+
+    assert first_page["Contents"][0]["Key"] == "Makefile"
+    # every range is listed only a few pages ahead of the consumer, and
+    # stops when the pages are not consumed anymore
+    assert list_objects.call_count <= 2 * (_PAGES_AHEAD + 2)
+
+
+@mock_s3
+def test_sharded_pages_raise_errors_of_ranges():
+    client = get_client()
+
+    with raises(ClientError):
+        list(iter_sharded_pages(client, "missing-bucket", ["a", "b"]))
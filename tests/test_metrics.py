@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for metrics module."""
+
+import json
+
+from pytest import raises
+
+from s3tree.metrics import LATENCY_BUCKETS, Metrics, OperationMetrics, SpanListener
+
+
+class DummySpan(object):
+    def __init__(self, name, start_time):
+        self.name = name
+        self.start_time = start_time
+        self.end_time = None
+        self.attributes = {}
+        self.exceptions = []
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc):
+        self.exceptions.append(exc)
+
+    def end(self, end_time=None):
+        self.end_time = end_time
+
+
+class DummyTracer(object):
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, start_time=None):
+        span = DummySpan(name, start_time)
+        self.spans.append(span)
+        return span
+
+
+def test_operation_metrics():
+    operation = OperationMetrics()
+    operation.add(0.001, 100, None)
+    operation.add(0.2, 50, None)
+    operation.add(60, 0, Exception())
+
+    assert operation.count == 3
+    assert operation.errors == 1
+    assert operation.bytes == 150
+    assert operation.max_time == 60
+    assert operation.histogram[0] == 1
+    assert operation.histogram[LATENCY_BUCKETS.index(0.25)] == 1
+    assert operation.histogram[-1] == 1
+
+
+def test_metrics_listeners():
+    calls = []
+    metrics = Metrics(listeners=[lambda *args: calls.append(args)])
+    metrics.record_call("GetObject", {"Key": "a"}, 0, 0.1, 10)
+    metrics.record_cache("body", True)
+    metrics.record_cache("body", False)
+
+    assert calls == [("GetObject", {"Key": "a"}, 0, 0.1, 10, None)]
+    data = json.loads(metrics.as_json)
+    assert data["operations"]["GetObject"]["count"] == 1
+    assert data["cache_hits"] == {"body": 1}
+    assert data["cache_misses"] == {"body": 1}
+
+    metrics.reset()
+    assert metrics.operations == {}
+
+
+def test_span_listener():
+    tracer = DummyTracer()
+    listener = SpanListener(tracer)
+    error = Exception()
+    listener("ListObjectsV2", {"Bucket": "b", "Prefix": "css/"}, 1, 0.5, 10, error)
+
+    span = tracer.spans[0]
+    assert span.name == "S3.ListObjectsV2"
+    assert span.end_time - span.start_time == 5 * 10 ** 8
+    assert span.attributes["aws.s3.prefix"] == "css/"
+    assert span.exceptions == [error]
+
+    with raises(ZeroDivisionError):
+        Metrics(listeners=[listener, lambda *args: 1 / 0]).record_call(
+            "HeadBucket", {}, 0, 0, 0
+        )
@@ -73,3 +73,33 @@ def test_file_as_dict_property(file_data, s3tree):
     data = json.loads(file_obj.as_json)
     assert data == orig_data
     assert file_obj.as_dict == orig_data
+
+
+def test_models_have_no_instance_dict(directory_data, file_data, s3tree):
+    # models use slots to stay small in memory
+    assert not hasattr(Directory(directory_data, s3tree), "__dict__")
+    assert not hasattr(File(file_data, s3tree), "__dict__")
+
+    # all the files share the same storage class string
+    other_data = dict(file_data, StorageClass="".join(["STAND", "ARD"]))
+    assert (
+        File(file_data, s3tree).storage_class is File(other_data, s3tree).storage_class
+    )
+
+
+def test_file_type(file_data, s3tree):
+    file_obj = File(file_data, s3tree)
+    assert file_obj.file_type == "image"
+    assert file_obj.mime.is_image
+
+    file_obj = File(dict(file_data, Key="admin/js/app.tar.gz"), s3tree)
+    assert file_obj.file_type == "binary"
+
+    # the extension is matched as written, like mimelib does
+    file_obj = File(dict(file_data, Key="admin/js/app.tar.Z"), s3tree)
+    assert file_obj.file_type == "binary"
+
+    # the actual content type of the file has precedence over its extension
+    file_obj.content_type = "text/plain"
+    assert file_obj.file_type == "text"
+    assert file_obj.mime.is_text
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for retry module."""
+
+from botocore.exceptions import ClientError
+from pytest import raises
+
+from s3tree.retry import RetryPolicy, TokenBucket
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code}}, "GetObject")
+
+
+def failing(*errors):
+    errors = list(errors)
+
+    def func():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    return func
+
+
+def test_retry_transient_errors():
+    policy = RetryPolicy(base_delay=0)
+    func = failing(client_error("SlowDown"), client_error("500"))
+    assert policy.call(func) == "ok"
+    assert policy.retries == 2
+
+
+def test_do_not_retry_other_errors():
+    policy = RetryPolicy(base_delay=0)
+
+    with raises(ClientError):
+        policy.call(failing(client_error("NoSuchKey")))
+
+    assert policy.retries == 0
+
+
+def test_give_up_after_max_attempts():
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+
+    with raises(ClientError):
+        policy.call(failing(*[client_error("503")] * 3))
+
+    assert policy.retries == 2
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+    assert all(0 <= policy.backoff(attempt) <= 5 for attempt in range(20))
+
+
+def test_token_bucket_adapts_its_rate():
+    bucket = TokenBucket(max_rate=100, min_rate=10)
+    bucket.throttled()
+    assert bucket.rate == 50
+    bucket.throttled()
+    bucket.throttled()
+    bucket.throttled()
+    assert bucket.rate == 10
+
+    bucket.succeeded()
+    assert bucket.rate == 11
+
+
+def test_token_bucket_limits_bursts():
+    bucket = TokenBucket(max_rate=1000, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    assert bucket._tokens < 1
+    bucket.acquire()
+
+
+def test_throttling_slows_the_rate_limiter():
+    bucket = TokenBucket(max_rate=1000)
+    policy = RetryPolicy(base_delay=0, rate_limiter=bucket)
+    assert policy.call(failing(client_error("SlowDown"))) == "ok"
+    assert bucket.rate == 510
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for snapshots."""
+import datetime
+import io
+
+import mock
+import pytest
+from dateutil.tz import tzutc
+
+from s3tree.core import S3Tree
+from s3tree.models import File
+from s3tree.snapshot import Snapshot
+
+
+def make_file(key, etag="foo", size=42, minute=0):
+    data = {
+        u"ETag": etag,
+        u"Key": key,
+        u"LastModified": datetime.datetime(2018, 3, 16, 13, minute, tzinfo=tzutc()),
+        u"Size": size,
+    }
+    return File(data, mock.MagicMock(spec=S3Tree))
+
+
+@pytest.fixture
+def snapshot():
+    files = [make_file("a.txt"), make_file("b/c.txt"), make_file("d.txt")]
+    return Snapshot.from_files("dummy", "", files)
+
+
+def test_snapshot_save_and_load(snapshot):
+    fp = io.StringIO()
+    snapshot.save(fp)
+    fp.seek(0)
+
+    loaded = Snapshot.load(fp)
+    assert loaded.entries == snapshot.entries
+    assert loaded.taken_at == snapshot.taken_at
+    assert loaded.last_key == "d.txt"
+
+
+def test_snapshot_diff(snapshot):
+    files = [
+        make_file("a.txt", minute=5),
+        make_file("b/c.txt", etag="bar"),
+        make_file("e.txt"),
+    ]
+    changes = snapshot.diff(files)
+    assert [f.path for f in changes.added] == ["e.txt"]
+    assert [f.path for f in changes.modified] == ["b/c.txt"]
+    assert changes.removed == ["d.txt"]
+    assert sorted(changes.snapshot.entries) == ["a.txt", "b/c.txt", "e.txt"]
+
+
+def test_snapshot_diff_new_keys_only(snapshot):
+    changes = snapshot.diff([make_file("e.txt")], new_keys_only=True)
+    assert [f.path for f in changes.added] == ["e.txt"]
+    assert changes.removed == []
+    assert len(changes.snapshot) == 4
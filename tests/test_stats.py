@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for tree statistics."""
+import json
+
+import mock
+
+from s3tree.core import S3Tree
+from s3tree.models import File
+from s3tree.stats import TreeStats
+
+
+def make_file(key, size, storage_class="STANDARD"):
+    data = {u"Key": key, u"Size": size, u"StorageClass": storage_class}
+    return File(data, mock.MagicMock(spec=S3Tree))
+
+
+def test_tree_stats():
+    stats = TreeStats("static/")
+    stats.add_file(make_file("static/css/app.css", 512, "GLACIER"))
+    stats.add_file(make_file("static/css/vendor/base.CSS", 512))
+    stats.add_file(make_file("static/index.js", 1024))
+
+    assert stats.total_bytes == 2048
+    assert stats.size == "2 KB"
+    assert stats.num_files == 3
+    assert stats.num_directories == 2
+    assert stats.by_extension == {
+        ".js": {"files": 1, "bytes": 1024},
+        ".css": {"files": 2, "bytes": 1024},
+    }
+    assert stats.by_storage_class == {
+        "STANDARD": {"files": 2, "bytes": 1536},
+        "GLACIER": {"files": 1, "bytes": 512},
+    }
+    assert stats.by_directory == {"css": {"files": 2, "bytes": 1024}}
+    assert json.loads(stats.as_json)["num_directories"] == 2
+
+
+def test_tree_stats_counts_each_directory_once():
+    stats = TreeStats("")
+    for key in ("a/b/1", "a/b/2", "a/b/c/3", "a/d/4", "a/e", "f/5"):
+        stats.add_file(make_file(key, 1))
+
+    # a/, a/b/, a/b/c/, a/d/ and f/
+    assert stats.num_directories == 5
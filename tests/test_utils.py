@@ -5,7 +5,8 @@
 import pytest
 
 from s3tree.exceptions import InvalidPathError
-from s3tree.utils import humanize_file_size, normalize_path
+from s3tree.utils import (glob_literal_prefix, glob_to_regex,
+                          humanize_file_size, normalize_path, replace_file)
 
 
 def test_normalize_path_not_a_string():
@@ -37,3 +38,40 @@ def test_humanize_file_size():
 
     for k, v in mapping:
         assert humanize_file_size(k) == v
+
+
+def test_glob_literal_prefix():
+    assert glob_literal_prefix("logs/2018-*.gz") == "logs/2018-"
+    assert glob_literal_prefix("logs/app.log") == "logs/app.log"
+    assert glob_literal_prefix("[ab]/c") == ""
+
+
+def test_glob_to_regex():
+    mapping = (
+        ("*.js", "index.js", True),
+        ("*.js", "js/index.js", False),
+        ("**/*.js", "index.js", True),
+        ("**/*.js", "js/vendor/angular.js", True),
+        ("js/*/*.js", "js/vendor/angular.js", True),
+        ("js/*/*.js", "js/vendor/latest/react.js", False),
+        ("js/**", "js/vendor/latest/react.js", True),
+        ("a?c.txt", "abc.txt", True),
+        ("a?c.txt", "a/c.txt", False),
+        ("[!_]*.py", "__init__.py", False),
+        ("[a-c]*.py", "base.py", True),
+        ("a.py", "axpy", False),
+    )
+
+    for pattern, key, matches in mapping:
+        assert bool(glob_to_regex(pattern).match(key)) == matches
+
+
+def test_replace_file(tmpdir):
+    source = tmpdir.join("source")
+    dest = tmpdir.join("dest")
+    source.write("new")
+    dest.write("old")
+
+    replace_file(str(source), str(dest))
+    assert not source.exists()
+    assert dest.read() == "new"